@@ -1,4 +1,9 @@
-from typing import List
+from typing import List, Iterable, Tuple, Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import mmap
+import os
+import numpy as np
 
 
 RAW = """199
@@ -19,16 +24,109 @@ def count_increasing(input: List[int], gap: int = 1) -> int:
             count += 1
     return count
 
+
+def load_depths(path: str) -> np.ndarray:
+    return np.fromfile(path, dtype=np.int64, sep=' ')
+
+
+def count_increasing_array(depths: np.ndarray, gap: int = 1) -> int:
+    return int(np.count_nonzero(depths[gap:] > depths[:-gap]))
+
+
+def count_increasing_stream(lines: Iterable[str], gap: int = 1) -> int:
+    # only the last gap depths are kept
+    window = deque(maxlen=gap)
+    count = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        depth = int(line)
+        if len(window) == gap and depth > window[0]:
+            count += 1
+        window.append(depth)
+    return count
+
+
+def count_increasing_file(path: str, gap: int = 1) -> int:
+    with open(path) as f:
+        return count_increasing_stream(f, gap)
+
+
+def chunk_boundaries(path: str, n_chunks: int) -> List[Tuple[int, int]]:
+    # byte ranges of roughly the same size, each one ending after a newline
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        boundaries = [0]
+        for k in range(1, n_chunks):
+            pos = mm.find(b'\n', max(size * k // n_chunks, boundaries[-1]))
+            if pos == -1:
+                break
+            if pos + 1 > boundaries[-1]:
+                boundaries.append(pos + 1)
+        if boundaries[-1] < size:
+            boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def count_increasing_chunk(path: str, start: int, stop: int,
+                           gap: int = 1) -> Tuple[int, List[int], List[int]]:
+    # count inside the chunk, and its first and last gap depths to
+    # compare against the neighbor chunks
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        depths = np.array(mm[start:stop].split(), dtype=np.int64)
+    count = count_increasing_array(depths, gap) if len(depths) > gap else 0
+    return count, depths[:gap].tolist(), depths[-gap:].tolist()
+
+
+def count_increasing_parallel(path: str, gap: int = 1,
+                              n_workers: Optional[int] = None,
+                              n_chunks: Optional[int] = None) -> int:
+    n_workers = n_workers or os.cpu_count() or 1
+    chunks = chunk_boundaries(path, n_chunks or 4 * n_workers)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        results = list(executor.map(count_increasing_chunk,
+                                    [path] * len(chunks),
+                                    [start for start, _ in chunks],
+                                    [stop for _, stop in chunks],
+                                    [gap] * len(chunks)))
+
+    count = 0
+    # last gap depths of all the chunks before
+    previous = []
+    for chunk_count, head, tail in results:
+        count += chunk_count
+        for j, depth in enumerate(head):
+            k = len(previous) - gap + j
+            if k >= 0 and depth > previous[k]:
+                count += 1
+        previous = (previous + tail)[-gap:]
+    return count
+
+
 if __name__ == '__main__':
     INPUT = [int(x) for x in RAW.strip().split('\n')]
     print('test case sol part 1')
     print(count_increasing(INPUT))
     print('test case sol part 2')
     print(count_increasing(INPUT, gap=3))
+    for gap, expected in [(1, 7), (3, 5)]:
+        assert count_increasing(INPUT, gap) == expected
+        assert count_increasing_array(np.array(INPUT), gap) == expected
+        assert count_increasing_stream(RAW.splitlines(), gap) == expected
     with open('data/input.txt') as f:
         raw = f.read()
     CONTEST_INPUT = [int(x) for x in raw.strip().split('\n')]
     print('contest solution part 1')
     print(count_increasing(CONTEST_INPUT))
     print('contest solution part 2')
-    print(count_increasing(CONTEST_INPUT, gap=3))
\ No newline at end of file
+    print(count_increasing(CONTEST_INPUT, gap=3))
+    contest_depths = load_depths('data/input.txt')
+    for gap in [1, 3]:
+        expected = count_increasing(CONTEST_INPUT, gap)
+        assert count_increasing_array(contest_depths, gap) == expected
+        assert count_increasing_file('data/input.txt', gap) == expected
+        assert count_increasing_parallel('data/input.txt', gap, n_workers=2) == expected
+        for n_chunks in [1, 7, 5000]:
+            assert count_increasing_parallel('data/input.txt', gap, 2, n_chunks) == expected
\ No newline at end of file
@@ -1,4 +1,7 @@
 from typing import List
+from bisect import bisect_left
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
 
 RAW = """
 00100
@@ -28,6 +31,42 @@ def compute_sub_power_consumption(bit_seq: List[str]) -> int:
     return gamma * eps
 
 
+def parse_bit_matrix(raw: bytes) -> np.ndarray:
+    # (n_lines, width) view of the '0'/'1' characters over raw itself, no copy;
+    # rows are width + len(newline) bytes apart so the last line needs no
+    # trailing newline, \n and \r\n line endings are both accepted
+    start = len(raw) - len(raw.lstrip())
+    end = len(raw.rstrip())
+    line_end = raw.find(b'\n', start, end)
+    if line_end < 0:
+        line_end = end
+    newline = b'\r\n' if raw[line_end - 1:line_end + 1] == b'\r\n' else b'\n'
+    width = line_end - start - (len(newline) - 1)
+    stride = width + len(newline)
+    buffer = np.frombuffer(raw, dtype=np.uint8)[start:end]
+    n_lines = (len(buffer) + len(newline)) // stride
+    if (n_lines * stride - len(newline) != len(buffer)
+            or raw.count(b'\n', start, end) != n_lines - 1
+            or any((buffer[width + k::stride] != c).any() for k, c in enumerate(newline))):
+        raise ValueError(f'report lines must all be {width} bits long '
+                         f'and end with {newline!r}')
+    return as_strided(buffer, shape=(n_lines, width), strides=(stride, 1),
+                      writeable=False)
+
+
+def column_popcounts(bit_matrix: np.ndarray) -> np.ndarray:
+    # number of '1' per column
+    return bit_matrix.sum(axis=0, dtype=np.int64) - ord('0') * len(bit_matrix)
+
+
+def compute_sub_power_consumption_packed(raw: bytes) -> int:
+    bit_matrix = parse_bit_matrix(raw)
+    most_common_is_1bit = column_popcounts(bit_matrix) >= len(bit_matrix) // 2
+    gamma = int(''.join('1' if b else '0' for b in most_common_is_1bit), 2)
+    eps = gamma ^ ((1 << bit_matrix.shape[1]) - 1)
+    return gamma * eps
+
+
 def compute_life_support_rating(bit_seq: List[str]) -> int:
     def _compute_life_support(bit_seq: List[str],
                               bit_pos: int,
@@ -53,18 +92,62 @@ def compute_life_support_rating(bit_seq: List[str]) -> int:
         
 
 
+class DiagnosticReport:
+    """
+    Report values sorted once. The values sharing a bit prefix are contiguous,
+    so filtering by one more bit splits a [lo, hi) range with a bisect.
+    """
+    def __init__(self, bit_seq: List[str]):
+        self.width = len(bit_seq[0])
+        self.values = sorted(int(bits, 2) for bits in bit_seq)
+
+    def rating(self, most_common: bool) -> int:
+        lo, hi = 0, len(self.values)
+        for shift in reversed(range(self.width)):
+            if hi - lo == 1:
+                break
+            # values in the range share every bit above shift
+            prefix = (self.values[lo] >> (shift + 1)) << (shift + 1)
+            split = bisect_left(self.values, prefix | (1 << shift), lo, hi)
+            ones, zeros = hi - split, split - lo
+            most_common_is_1bit = ones >= zeros
+            if most_common_is_1bit == most_common:
+                lo = split
+            else:
+                hi = split
+            if lo == hi:
+                raise ValueError('no value left in the report')
+        if hi - lo != 1:
+            raise ValueError('more than one value left in the report')
+        return self.values[lo]
+
+    def life_support_rating(self) -> int:
+        return self.rating(True) * self.rating(False)
+
+
 if __name__ == '__main__':
     INPUT = RAW.strip().splitlines()
     sol1_base_case = compute_sub_power_consumption(INPUT)
     print('test case sol part 1')
     print(sol1_base_case)
     assert sol1_base_case == 198
+    assert compute_sub_power_consumption_packed(RAW.encode()) == 198
+    assert compute_sub_power_consumption_packed(RAW.replace('\n', '\r\n').encode()) == 198
+    for ragged in [b'101\n01\n110', b'10\n1\n\n01', b'101\n0110\n11', b'101\r\n010\n110']:
+        try:
+            parse_bit_matrix(ragged)
+            raise AssertionError(f'{ragged!r} should not parse')
+        except ValueError:
+            pass
 
     sol2_base_case = compute_life_support_rating(INPUT)
     print('test case sol part 2')
     print(sol2_base_case)
 
     assert sol2_base_case == 230
+    REPORT = DiagnosticReport(INPUT)
+    assert REPORT.rating(True) == 23 and REPORT.rating(False) == 10
+    assert REPORT.life_support_rating() == 230
 
     with open('data/input.txt') as f:
         raw = f.read()
@@ -73,6 +156,8 @@ if __name__ == '__main__':
     sol1_test_output = compute_sub_power_consumption(TEST_INPUT)
     print('contest sol part 1')
     print(sol1_test_output)
+    assert compute_sub_power_consumption_packed(raw.encode()) == sol1_test_output
     print('contest sol part 2')
     sol2_test_output = compute_life_support_rating(TEST_INPUT)
-    print(sol2_test_output)
\ No newline at end of file
+    print(sol2_test_output)
+    assert DiagnosticReport(TEST_INPUT).life_support_rating() == sol2_test_output
\ No newline at end of file
@@ -1,5 +1,7 @@
-from typing import List
+from typing import List, Dict, Tuple, Iterator, NamedTuple
+from collections import defaultdict
 import itertools
+import numpy as np
 
 RAW = """7,4,9,5,11,17,23,2,0,14,21,24,10,16,13,6,15,25,12,22,18,20,8,19,3,26,1
 
@@ -42,6 +44,13 @@ class Board:
         except ValueError:
             pass
 
+    def mark_cell(self, row: int, col: int, n: int) -> bool:
+        # returns True if the marked row or column is complete
+        self.marked_rows[row] += 1
+        self.marked_cols[col] += 1
+        self.total_sum -= n
+        return self.marked_rows[row] == 5 or self.marked_cols[col] == 5
+
     def bingo_score(self) -> int:
         for count in itertools.chain(self.marked_rows, self.marked_cols):
             if count == 5:
@@ -62,6 +71,90 @@ def parse_input(string: str):
     return numbers, boards
 
 
+def build_number_index(boards: List[Board]) -> Dict[int, List[Tuple[int, int, int]]]:
+    # number -> (board, row, col) of every cell with that number
+    index = defaultdict(list)
+    for board_idx, board in enumerate(boards):
+        for cell, n in enumerate(board.board):
+            index[n].append((board_idx, cell // 5, cell % 5))
+    return index
+
+
+def iter_winning_boards(numbers: List[int],
+                        boards: List[Board]) -> Iterator[Tuple[int, int]]:
+    # yields (board index, score) in winning order, a draw only
+    # touches the boards containing the number
+    index = build_number_index(boards)
+    has_won = [False] * len(boards)
+    for n in numbers:
+        for board_idx, row, col in index.get(n, ()):
+            if not has_won[board_idx] and boards[board_idx].mark_cell(row, col, n):
+                has_won[board_idx] = True
+                yield board_idx, n * boards[board_idx].total_sum
+
+
+def compute_bingo_score_indexed(numbers: List[int],
+                                boards: List[Board]) -> int:
+    for _, score in iter_winning_boards(numbers, boards):
+        return score
+    raise ValueError('No winner!')
+
+
+def compute_last_bingo_score_indexed(numbers: List[int],
+                                     boards: List[Board]) -> int:
+    score = None
+    for _, score in iter_winning_boards(numbers, boards):
+        pass
+    if score is None:
+        raise ValueError('No winner!')
+    return score
+
+
+class BingoGame(NamedTuple):
+    # turn each board wins, len(numbers) if it never does
+    winning_turns: np.ndarray
+    # winning boards in winning order, and their scores
+    win_order: np.ndarray
+    scores: np.ndarray
+
+
+def parse_input_array(string: str) -> Tuple[np.ndarray, np.ndarray]:
+    numbers, grids = string.strip().split('\n\n', 1)
+    numbers = np.array(numbers.strip().split(','), dtype=np.int64)
+    board_numbers = np.array(grids.split(), dtype=np.int64).reshape(-1, 5, 5)
+    return numbers, board_numbers
+
+
+def boards_to_array(boards: List[Board]) -> np.ndarray:
+    return np.array([board.board for board in boards], dtype=np.int64).reshape(-1, 5, 5)
+
+
+def solve_bingo(numbers: np.ndarray, board_numbers: np.ndarray) -> BingoGame:
+    numbers = np.asarray(numbers, dtype=np.int64)
+    n_draws = len(numbers)
+    max_value = max(numbers.max(), board_numbers.max())
+
+    # turn each number is drawn, n_draws for numbers never drawn
+    rank = np.full(max_value + 1, n_draws, dtype=np.int32)
+    drawn, first_turn = np.unique(numbers, return_index=True)
+    rank[drawn] = first_turn
+    ranks = rank[board_numbers]
+
+    # a line is complete when its last number is drawn
+    row_turns = ranks.max(axis=2).min(axis=1)
+    col_turns = ranks.max(axis=1).min(axis=1)
+    winning_turns = np.minimum(row_turns, col_turns)
+
+    win_order = np.argsort(winning_turns, kind='stable')
+    win_order = win_order[winning_turns[win_order] < n_draws]
+    turns = winning_turns[win_order]
+
+    unmarked = ranks[win_order] > turns[:, None, None]
+    unmarked_sum = (board_numbers[win_order] * unmarked).sum(axis=(1, 2))
+    scores = unmarked_sum * numbers[turns]
+    return BingoGame(winning_turns, win_order, scores)
+
+
 def compute_bingo_score(numbers: List[int],
                         boards: List[Board]) -> int:
     for n in numbers:
@@ -108,6 +201,21 @@ if __name__ == '__main__':
     print(test_case_sol2)
     assert test_case_sol2 == 1924
 
+    numbers, boards = parse_input(RAW)
+    assert compute_bingo_score_indexed(numbers, boards) == 4512
+    numbers, boards = parse_input(RAW)
+    assert compute_last_bingo_score_indexed(numbers, boards) == 1924
+    numbers, boards = parse_input(RAW)
+    assert [board_idx for board_idx, _ in iter_winning_boards(numbers, boards)] == [2, 0, 1]
+
+    numbers, boards = parse_input(RAW)
+    game = solve_bingo(np.array(numbers), boards_to_array(boards))
+    assert game.scores[0] == 4512 and game.scores[-1] == 1924
+    assert game.win_order.tolist() == [2, 0, 1]
+    assert all(board.total_sum == sum(board.board) for board in boards)
+    game = solve_bingo(*parse_input_array(RAW))
+    assert game.winning_turns.tolist() == [13, 14, 11]
+
     with open('data/input.txt') as f:
         test_raw = f.read()
 
@@ -121,5 +229,16 @@ if __name__ == '__main__':
     print('contest sol part 2')
     print(sol2_test_output)
 
+    test_numbers, test_boards = parse_input(test_raw)
+    assert compute_bingo_score_indexed(test_numbers, test_boards) == sol1_test_output
+    test_numbers, test_boards = parse_input(test_raw)
+    assert compute_last_bingo_score_indexed(test_numbers, test_boards) == sol2_test_output
+
+    test_numbers, test_boards = parse_input(test_raw)
+    test_winners = list(iter_winning_boards(test_numbers, test_boards))
+    test_game = solve_bingo(*parse_input_array(test_raw))
+    assert test_game.win_order.tolist() == [board_idx for board_idx, _ in test_winners]
+    assert test_game.scores.tolist() == [score for _, score in test_winners]
+
 
          
\ No newline at end of file
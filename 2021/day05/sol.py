@@ -1,5 +1,11 @@
-from typing import NamedTuple, List
-from collections import Counter
+from typing import NamedTuple, List, Tuple, Iterator, Optional
+from collections import Counter, defaultdict
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import itertools
+import os
+import numpy as np
 
 RAW = """0,9 -> 5,9
 8,0 -> 0,8
@@ -52,7 +58,294 @@ class Line(NamedTuple):
         y_range = range(self.y1, self.y2 + dy, dy)
         return zip(x_range, y_range)
 
-def compute_grid_score(lines: List[Line], only_hv_lines: bool = True):
+def lines_to_array(lines: List[Line], only_hv_lines: bool = True) -> np.ndarray:
+    # (n_lines, 4) array of x1, y1, x2, y2
+    corrs = np.array(lines, dtype=np.int64).reshape(-1, 4)
+    if only_hv_lines:
+        corrs = corrs[(corrs[:, 0] == corrs[:, 2]) | (corrs[:, 1] == corrs[:, 3])]
+    return corrs
+
+
+def rasterize_lines(corrs: np.ndarray):
+    # x and y of every point covered by the lines, lines are horizontal,
+    # vertical or 45 degrees diagonals
+    x1, y1, x2, y2 = corrs.T
+    dx = np.sign(x2 - x1)
+    dy = np.sign(y2 - y1)
+    length = np.maximum(np.abs(x2 - x1), np.abs(y2 - y1)) + 1
+
+    starts = np.cumsum(length) - length
+    steps = np.arange(length.sum()) - np.repeat(starts, length)
+    xs = np.repeat(x1, length) + steps * np.repeat(dx, length)
+    ys = np.repeat(y1, length) + steps * np.repeat(dy, length)
+    return xs, ys
+
+
+def count_overlaps(corrs: np.ndarray, x0: int, y0: int, width: int, height: int) -> int:
+    # lines must lie inside the width x height box at (x0, y0)
+    xs, ys = rasterize_lines(corrs)
+    grid = np.bincount((ys - y0) * width + (xs - x0), minlength=width * height)
+    return int(np.count_nonzero(grid >= 2))
+
+
+def compute_grid_score_dense(lines: List[Line], only_hv_lines: bool = True) -> int:
+    corrs = lines_to_array(lines, only_hv_lines)
+    if len(corrs) == 0:
+        return 0
+    x0, y0 = corrs[:, [0, 2]].min(), corrs[:, [1, 3]].min()
+    width = corrs[:, [0, 2]].max() - x0 + 1
+    height = corrs[:, [1, 3]].max() - y0 + 1
+    return count_overlaps(corrs, x0, y0, width, height)
+
+
+def clip_to_band(corrs: np.ndarray, y_lo: int, y_hi: int) -> np.ndarray:
+    # the part of each line with y_lo <= y <= y_hi
+    x1, y1, x2, y2 = corrs.T
+    inside = (np.maximum(y1, y2) >= y_lo) & (np.minimum(y1, y2) <= y_hi)
+    x1, y1, x2, y2 = corrs[inside].T
+    dx = np.sign(x2 - x1)
+    dy = np.sign(y2 - y1)
+
+    # steps along the line where it enters and leaves the band,
+    # horizontal lines are kept whole
+    ya = np.clip(y1, y_lo, y_hi)
+    yb = np.clip(y2, y_lo, y_hi)
+    length = np.maximum(np.abs(x2 - x1), np.abs(y2 - y1))
+    t_start = np.where(dy == 0, 0, (ya - y1) * dy)
+    t_end = np.where(dy == 0, length, (yb - y1) * dy)
+    return np.stack([x1 + t_start * dx, y1 + t_start * dy,
+                     x1 + t_end * dx, y1 + t_end * dy], axis=1)
+
+
+def count_band_overlaps(shm_name: str, n_rows: int, start: int, stop: int,
+                        x0: int, y0: int, width: int, height: int) -> int:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    corrs = np.ndarray((n_rows, 4), dtype=np.int64, buffer=shm.buf)
+    try:
+        return count_overlaps(corrs[start:stop], x0, y0, width, height)
+    finally:
+        del corrs
+        shm.close()
+
+
+def compute_grid_score_parallel(lines: List[Line], only_hv_lines: bool = True,
+                                n_workers: Optional[int] = None,
+                                n_bands: Optional[int] = None) -> int:
+    """
+    Split the plane in row bands, clip the lines to each band and count every
+    band in a worker process. The clipped lines are handed to the workers
+    through shared memory.
+    """
+    corrs = lines_to_array(lines, only_hv_lines)
+    if len(corrs) == 0:
+        return 0
+    n_workers = n_workers or os.cpu_count() or 1
+    n_bands = n_bands or 4 * n_workers
+    x0, y0 = corrs[:, [0, 2]].min(), corrs[:, [1, 3]].min()
+    width = corrs[:, [0, 2]].max() - x0 + 1
+    y_max = corrs[:, [1, 3]].max()
+    edges = np.unique(np.linspace(y0, y_max + 1, n_bands + 1).astype(np.int64))
+
+    bands = [(y_lo, y_hi - 1, clip_to_band(corrs, y_lo, y_hi - 1))
+             for y_lo, y_hi in zip(edges[:-1], edges[1:])]
+    n_rows = sum(len(clipped) for _, _, clipped in bands)
+    shm = shared_memory.SharedMemory(create=True, size=max(n_rows, 1) * 4 * 8)
+    try:
+        shared = np.ndarray((n_rows, 4), dtype=np.int64, buffer=shm.buf)
+        jobs = []
+        start = 0
+        for y_lo, y_hi, clipped in bands:
+            stop = start + len(clipped)
+            shared[start:stop] = clipped
+            if stop > start:
+                jobs.append((start, stop, y_lo, y_hi - y_lo + 1))
+            start = stop
+        del shared
+
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(count_band_overlaps, shm.name, n_rows, start, stop,
+                                       int(x0), int(y_lo), int(width), int(height))
+                       for start, stop, y_lo, height in jobs]
+            return sum(future.result() for future in futures)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+XY = Tuple[int, int]
+Intervals = List[Tuple[int, int]]
+
+# each family of parallel lines has a key = a * x + b * y constant along the
+# line, the position along the line is x, or y for vertical lines
+FAMILIES = {
+    'h': (0, 1),
+    'v': (1, 0),
+    'd1': (1, -1),
+    'd2': (1, 1),
+}
+
+
+def family_key(family: str, point: XY) -> int:
+    a, b = FAMILIES[family]
+    return a * point[0] + b * point[1]
+
+
+def family_position(family: str, point: XY) -> int:
+    return point[1] if family == 'v' else point[0]
+
+
+def family_point(family: str, key: int, position: int) -> XY:
+    if family == 'v':
+        return key, position
+    a, b = FAMILIES[family]
+    # b is 1 or -1
+    return position, (key - a * position) * b
+
+
+def line_family(line: Line) -> Tuple[str, int, int, int]:
+    if line.y1 == line.y2:
+        family = 'h'
+    elif line.x1 == line.x2:
+        family = 'v'
+    elif line.x2 - line.x1 == line.y2 - line.y1:
+        family = 'd1'
+    elif line.x2 - line.x1 == line.y1 - line.y2:
+        family = 'd2'
+    else:
+        raise ValueError(f'line is not horizontal, vertical or diagonal: {line}')
+    start, end = (line.x1, line.y1), (line.x2, line.y2)
+    lo, hi = sorted([family_position(family, start), family_position(family, end)])
+    return family, family_key(family, start), lo, hi
+
+
+def add_interval(intervals: Intervals, lo: int, hi: int) -> None:
+    if intervals and intervals[-1][1] + 1 >= lo:
+        intervals[-1] = (intervals[-1][0], hi)
+    else:
+        intervals.append((lo, hi))
+
+
+def cover_intervals(intervals: Intervals) -> Tuple[Intervals, Intervals]:
+    # merged intervals covered at least once and at least twice
+    events = sorted([(lo, 1) for lo, _ in intervals] +
+                    [(hi + 1, -1) for _, hi in intervals])
+    covered, overlapped = [], []
+    count = 0
+    prev = None
+    for pos, delta in events:
+        if prev is not None and pos > prev:
+            if count >= 1:
+                add_interval(covered, prev, pos - 1)
+            if count >= 2:
+                add_interval(overlapped, prev, pos - 1)
+        count += delta
+        prev = pos
+    return covered, overlapped
+
+
+def in_intervals(intervals: Intervals, position: int) -> bool:
+    idx = bisect_right(intervals, (position, float('inf'))) - 1
+    return idx >= 0 and intervals[idx][1] >= position
+
+
+def orthogonal_intersections(a_segments: List[Tuple[int, int, int]],
+                             b_segments: List[Tuple[int, int, int]],
+                             ) -> Iterator[Tuple[int, int]]:
+    """
+    Sweep over u, a_segments are (u, v0, v1) and b_segments (v, u0, u1),
+    yields the (u, v) of every crossing.
+    """
+    events = []
+    for v, u0, u1 in b_segments:
+        events.append((u0, 0, v))
+        events.append((u1, 2, v))
+    for u, v0, v1 in a_segments:
+        events.append((u, 1, (v0, v1)))
+    events.sort(key=lambda event: event[:2])
+
+    active = []
+    for u, kind, data in events:
+        if kind == 0:
+            insort(active, data)
+        elif kind == 2:
+            active.pop(bisect_left(active, data))
+        else:
+            v0, v1 = data
+            for v in active[bisect_left(active, v0):bisect_right(active, v1)]:
+                yield u, v
+
+
+def crossing_point(family_a: str, key_a: int, family_b: str, key_b: int) -> Optional[XY]:
+    (a1, b1), (a2, b2) = FAMILIES[family_a], FAMILIES[family_b]
+    det = a1 * b2 - a2 * b1
+    x, rx = divmod(key_a * b2 - key_b * b1, det)
+    y, ry = divmod(a1 * key_b - a2 * key_a, det)
+    # two diagonals can cross between cells
+    if rx or ry:
+        return None
+    return x, y
+
+
+def compute_grid_score_sweep(lines: List[Line], only_hv_lines: bool = True) -> int:
+    """
+    Count the overlaps without enumerating the points: the cells covered at
+    least twice by one family of lines are merged intervals, and cells
+    covered by two different families are crossings between those intervals.
+    """
+    groups = {family: defaultdict(list) for family in FAMILIES}
+    for line in lines:
+        if only_hv_lines and not line.is_hv():
+            continue
+        family, key, lo, hi = line_family(line)
+        groups[family][key].append((lo, hi))
+
+    covered = {family: {} for family in FAMILIES}
+    overlapped = {family: {} for family in FAMILIES}
+    score = 0
+    for family, by_key in groups.items():
+        for key, intervals in by_key.items():
+            covered[family][key], overlapped[family][key] = cover_intervals(intervals)
+            score += sum(hi - lo + 1 for lo, hi in overlapped[family][key])
+
+    def _segments(family: str, other: str) -> List[Tuple[int, int, int]]:
+        # intervals of a family as (key, other key range)
+        segments = []
+        for key, intervals in covered[family].items():
+            for lo, hi in intervals:
+                start = family_key(other, family_point(family, key, lo))
+                end = family_key(other, family_point(family, key, hi))
+                segments.append((key, min(start, end), max(start, end)))
+        return segments
+
+    crossings = set()
+    for family_a, family_b in itertools.combinations(FAMILIES, 2):
+        for key_a, key_b in orthogonal_intersections(_segments(family_a, family_b),
+                                                     _segments(family_b, family_a)):
+            point = crossing_point(family_a, key_a, family_b, key_b)
+            if point is not None:
+                crossings.add(point)
+
+    # a crossing always overlaps, but it was already counted once for
+    # every family where it overlaps on its own
+    for point in crossings:
+        n_counted = sum(in_intervals(overlapped[family].get(family_key(family, point), []),
+                                     family_position(family, point))
+                        for family in FAMILIES)
+        score += 1 - n_counted
+    return score
+
+
+def compute_grid_score(lines: List[Line], only_hv_lines: bool = True,
+                       method: str = 'counter', n_workers: Optional[int] = None):
+    if method == 'parallel':
+        return compute_grid_score_parallel(lines, only_hv_lines, n_workers)
+    if method == 'dense':
+        return compute_grid_score_dense(lines, only_hv_lines)
+    if method == 'sweep':
+        return compute_grid_score_sweep(lines, only_hv_lines)
+    if method != 'counter':
+        raise ValueError(f'unknown method: {method}')
+
     counter = Counter(
         corr
         for line in lines
@@ -77,6 +370,23 @@ if __name__ == '__main__':
     print(test_case_sol2)
     assert test_case_sol2 == 12
 
+    assert compute_grid_score(LINES, only_hv_lines=True, method='dense') == 5
+    assert compute_grid_score(LINES, only_hv_lines=False, method='dense') == 12
+    assert compute_grid_score(LINES, only_hv_lines=True, method='sweep') == 5
+    assert compute_grid_score(LINES, only_hv_lines=False, method='sweep') == 12
+    assert compute_grid_score(LINES, only_hv_lines=True, method='parallel', n_workers=2) == 5
+    assert compute_grid_score(LINES, only_hv_lines=False, method='parallel', n_workers=2) == 12
+    assert compute_grid_score_parallel(LINES, only_hv_lines=False, n_workers=2, n_bands=100) == 12
+
+    # the same vents far away from the origin
+    OFFSET = 10 ** 9
+    FAR_LINES = [Line(x1 + OFFSET, y1 + OFFSET, x2 + OFFSET, y2 + OFFSET)
+                 for x1, y1, x2, y2 in LINES]
+    assert compute_grid_score(FAR_LINES, only_hv_lines=False, method='sweep') == 12
+    LONG_LINES = [Line(0, 0, OFFSET, 0), Line(OFFSET, 0, 0, 0), Line(5, 5, 5, -5),
+                  Line(0, OFFSET, OFFSET, 0), Line(-2, -2, OFFSET, OFFSET)]
+    assert compute_grid_score(LONG_LINES, only_hv_lines=False, method='sweep') == OFFSET + 3
+
     with open('data/input.txt') as f:
         CONTEST_RAW = f.read()
 
@@ -92,4 +402,9 @@ if __name__ == '__main__':
     print('contest sol par 2')
     print(contest_sol_par2)
     assert contest_sol_par2 == 23864
+    assert compute_grid_score(CONTEST_LINES, only_hv_lines=True, method='dense') == contest_sol_par1
+    assert compute_grid_score(CONTEST_LINES, only_hv_lines=False, method='dense') == contest_sol_par2
+    assert compute_grid_score(CONTEST_LINES, only_hv_lines=True, method='sweep') == contest_sol_par1
+    assert compute_grid_score(CONTEST_LINES, only_hv_lines=False, method='sweep') == contest_sol_par2
+    assert compute_grid_score(CONTEST_LINES, only_hv_lines=False, method='parallel') == contest_sol_par2
     
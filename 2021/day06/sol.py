@@ -1,4 +1,5 @@
-from typing import List
+from typing import List, Optional
+from functools import lru_cache
 
 
 RAW = """3,4,3,1,2"""
@@ -20,6 +21,131 @@ def count_lanternfish(fish_timers: List[int],
     return sum(timers)
 
 
+Matrix = List[List[int]]
+NTIMERS = 9
+
+
+def transition_matrix() -> Matrix:
+    # m[i][j] is the number of fish with timer i after one day,
+    # coming from a fish with timer j
+    m = [[0] * NTIMERS for _ in range(NTIMERS)]
+    for j in range(1, NTIMERS):
+        m[j - 1][j] = 1
+    m[6][0] = 1
+    m[8][0] = 1
+    return m
+
+
+def mat_mul(a: Matrix, b: Matrix, modulus: Optional[int] = None) -> Matrix:
+    cols = list(zip(*b))
+    product = [[sum(x * y for x, y in zip(row, col)) for col in cols] for row in a]
+    if modulus is not None:
+        product = [[x % modulus for x in row] for row in product]
+    return product
+
+
+def mat_pow(m: Matrix, n: int, modulus: Optional[int] = None) -> Matrix:
+    result = [[int(i == j) for j in range(len(m))] for i in range(len(m))]
+    while n:
+        if n & 1:
+            result = mat_mul(result, m, modulus)
+        n >>= 1
+        if n:
+            m = mat_mul(m, m, modulus)
+    return result
+
+
+def vec_mat(v: List[int], m: Matrix, modulus: Optional[int] = None) -> List[int]:
+    product = [sum(x * y for x, y in zip(v, col)) for col in zip(*m)]
+    if modulus is not None:
+        product = [x % modulus for x in product]
+    return product
+
+
+class PowerCache:
+    """
+    Memoised powers M^(2^k) of the transition matrix. The fish per initial
+    timer after n days is the row vector of ones times M^n, so a query is one
+    vector-matrix product per set bit of n.
+    """
+    def __init__(self, modulus: Optional[int] = None):
+        self.modulus = modulus
+        m = transition_matrix()
+        if modulus is not None:
+            m = [[x % modulus for x in row] for row in m]
+        self.powers = [m]
+
+    def power(self, k: int) -> Matrix:
+        while len(self.powers) <= k:
+            last = self.powers[-1]
+            self.powers.append(mat_mul(last, last, self.modulus))
+        return self.powers[k]
+
+    def fish_per_timer(self, ndays: int) -> List[int]:
+        weights = [1] * NTIMERS
+        if self.modulus is not None:
+            weights = [w % self.modulus for w in weights]
+        k = 0
+        while ndays:
+            if ndays & 1:
+                weights = vec_mat(weights, self.power(k), self.modulus)
+            ndays >>= 1
+            k += 1
+        return weights
+
+
+EXACT_POWER_CACHE = PowerCache()
+MAX_MODULAR_CACHES = 32
+
+
+@lru_cache(maxsize=MAX_MODULAR_CACHES)
+def modular_power_cache(modulus: int) -> PowerCache:
+    return PowerCache(modulus)
+
+
+def get_power_cache(modulus: Optional[int] = None) -> PowerCache:
+    if modulus is None:
+        return EXACT_POWER_CACHE
+    return modular_power_cache(modulus)
+
+
+def fish_per_timer(ndays: int, modulus: Optional[int] = None) -> List[int]:
+    # number of fish after ndays coming from a single fish with timer j
+    return get_power_cache(modulus).fish_per_timer(ndays)
+
+
+def timer_counts(fish_timers: List[int]) -> List[int]:
+    timers = [0] * NTIMERS
+    for fish_timer in fish_timers:
+        timers[fish_timer] += 1
+    return timers
+
+
+def count_lanternfish_matrix(fish_timers: List[int],
+                             ndays: int = 80,
+                             modulus: Optional[int] = None) -> int:
+    weights = fish_per_timer(ndays, modulus)
+    total = sum(w * c for w, c in zip(weights, timer_counts(fish_timers)))
+    return total if modulus is None else total % modulus
+
+
+def count_lanternfish_batch(populations: List[List[int]],
+                            horizons: List[int],
+                            modulus: Optional[int] = None) -> List[List[int]]:
+    # result[p][h] is the size of the population p after horizons[h] days,
+    # the matrix power of each horizon is computed once
+    weights = [fish_per_timer(ndays, modulus) for ndays in horizons]
+    result = []
+    for fish_timers in populations:
+        counts = timer_counts(fish_timers)
+        totals = [sum(w * c for w, c in zip(horizon_weights, counts))
+                  for horizon_weights in weights]
+        if modulus is not None:
+            totals = [total % modulus for total in totals]
+        result.append(totals)
+    return result
+
+
 if __name__ == '__main__':
 
     INPUT = list(map(int, RAW.split(',')))
@@ -34,6 +160,28 @@ if __name__ == '__main__':
     print(test_case_sol2)
     assert test_case_sol2 == 26984457539
 
+    assert count_lanternfish_matrix(INPUT) == 5934
+    assert count_lanternfish_matrix(INPUT, 256) == 26984457539
+    assert count_lanternfish_matrix(INPUT, 256, 1_000_000_007) == 26984457539 % 1_000_000_007
+    assert all(count_lanternfish_matrix(INPUT, ndays) == count_lanternfish(INPUT, ndays)
+               for ndays in range(100))
+    assert count_lanternfish_batch([INPUT, [8], []], [0, 18, 80, 256]) == [
+        [5, 26, 5934, 26984457539],
+        [1, count_lanternfish([8], 18), count_lanternfish([8], 80), count_lanternfish([8], 256)],
+        [0, 0, 0, 0]]
+    huge = count_lanternfish_batch([INPUT], [10 ** 15], 1_000_000_007)[0][0]
+    assert 0 <= huge < 1_000_000_007
+
+    for ndays in [0, 1, 7, 80, 256, 1000]:
+        power = mat_pow(transition_matrix(), ndays)
+        assert fish_per_timer(ndays) == [sum(col) for col in zip(*power)]
+        power = mat_pow(transition_matrix(), ndays, 97)
+        assert fish_per_timer(ndays, 97) == [sum(col) % 97 for col in zip(*power)]
+    assert len(get_power_cache(97).powers) == 10
+    for modulus in range(2, 2 + 2 * MAX_MODULAR_CACHES):
+        fish_per_timer(10 ** 15, modulus)
+    assert modular_power_cache.cache_info().currsize == MAX_MODULAR_CACHES
+
 
     with open('data/input.txt') as f:
         contest_raw = f.read()
@@ -46,3 +194,4 @@ if __name__ == '__main__':
     contest_sol2 = count_lanternfish(contest_input, 256)
     print('contest sol part 2')
     print(contest_sol2)
+    assert count_lanternfish_matrix(contest_input, 256) == contest_sol2
@@ -1,6 +1,7 @@
-from typing import List, NamedTuple
+from typing import List, NamedTuple, Dict, Iterator
 import itertools
 from collections import Counter
+import numpy as np
 
 RAW = """be cfbegad cbdgef fgaecd cgeb fdcge agebfd fecdb fabcd edb | fdgacbe cefdb cefbgd gcbe
 edbfga begcd cbg gc gcadebf fbgde acbgfd abcde gfcbed gfec | fcgedb cgb dgebacf gc
@@ -27,6 +28,36 @@ DIGIT_MAPPER = {'abcefg': 0,
                 }
 
 
+SEGMENTS = 'abcdefg'
+SEGMENT_BITS = {segment: 1 << i for i, segment in enumerate(SEGMENTS)}
+
+
+def pattern_mask(pattern: str) -> int:
+    mask = 0
+    for segment in pattern:
+        mask |= SEGMENT_BITS[segment]
+    return mask
+
+
+def segment_counts(masks: List[int]) -> List[int]:
+    # number of patterns using each segment
+    return [sum((mask >> i) & 1 for mask in masks) for i in range(len(SEGMENTS))]
+
+
+def mask_signature(mask: int, counts: List[int]) -> int:
+    # sum of the counts of the segments in the pattern,
+    # it does not depend on the wiring
+    return sum(count for i, count in enumerate(counts) if (mask >> i) & 1)
+
+
+def build_signature_table() -> Dict[int, int]:
+    masks = {digit: pattern_mask(pattern) for pattern, digit in DIGIT_MAPPER.items()}
+    counts = segment_counts(list(masks.values()))
+    table = {mask_signature(mask, counts): digit for digit, mask in masks.items()}
+    assert len(table) == len(DIGIT_MAPPER)
+    return table
+
+
 class Display(NamedTuple):
     output_digits: List[str]
     signal_pattern: List[str]
@@ -97,11 +128,107 @@ def sum_and_decode_digits(displays: List[Display]) -> int:
     return sum(map(decode_7sg_digit, displays))
 
 
+SIGNATURE_TABLE = build_signature_table()
+
+
+def decode_7sg_digit_signature(display: Display) -> int:
+    masks = [pattern_mask(pattern) for pattern in display.signal_pattern]
+    counts = segment_counts(masks)
+    mask_to_digit = {mask: SIGNATURE_TABLE[mask_signature(mask, counts)] for mask in masks}
+    output = 0
+    for digit in display.output_digits:
+        output = output * 10 + mask_to_digit[pattern_mask(digit)]
+    return output
+
+
+def sum_and_decode_digits_signature(displays: List[Display]) -> int:
+    return sum(map(decode_7sg_digit_signature, displays))
+
+
+# number of lit segments of every 7 bit mask
+POPCOUNT = np.array([bin(mask).count('1') for mask in range(1 << len(SEGMENTS))], dtype=np.uint8)
+SIGNATURE_DIGITS = np.full(max(SIGNATURE_TABLE) + 1, -1, dtype=np.int8)
+for signature, digit in SIGNATURE_TABLE.items():
+    SIGNATURE_DIGITS[signature] = digit
+CHUNK_BYTES = 1 << 20
+
+
+def record_chunks(raw: bytes, chunk_bytes: int = CHUNK_BYTES) -> Iterator[memoryview]:
+    # slices of roughly chunk_bytes, each one ending after a newline
+    view = memoryview(raw)
+    start = 0
+    while start < len(raw):
+        end = raw.find(b'\n', start + chunk_bytes)
+        end = len(raw) if end < 0 else end + 1
+        yield view[start:end]
+        start = end
+
+
+def parse_chunk_masks(chunk: memoryview) -> np.ndarray:
+    chars = np.frombuffer(chunk, dtype=np.uint8)
+    is_segment = (chars >= ord('a')) & (chars <= ord('g'))
+    # a pattern starts on a segment that does not follow another one
+    starts = is_segment.copy()
+    starts[1:] &= ~is_segment[:-1]
+    segment_starts = np.flatnonzero(starts[is_segment])
+    if len(segment_starts) % 14:
+        raise ValueError(f'{len(segment_starts)} patterns is not a multiple of 14')
+    if not len(segment_starts):
+        return np.empty((0, 14), dtype=np.uint8)
+
+    bits = np.left_shift(np.uint8(1), chars[is_segment] - np.uint8(ord('a')))
+    return np.bitwise_or.reduceat(bits, segment_starts).reshape(-1, 14)
+
+
+def parse_display_masks(raw: bytes) -> np.ndarray:
+    """
+    Parse all the displays into a (n_displays, 14) array of segment masks,
+    the 10 signal patterns followed by the 4 output digits. The input is
+    parsed in chunks of whole lines to keep the temporaries small.
+    """
+    chunks = [parse_chunk_masks(chunk) for chunk in record_chunks(raw)]
+    if not chunks:
+        return np.empty((0, 14), dtype=np.uint8)
+    return np.concatenate(chunks)
+
+
+def count_digits_1478_batch(masks: np.ndarray) -> int:
+    histogram = np.bincount(POPCOUNT[masks[:, 10:]].ravel(), minlength=len(SEGMENTS) + 1)
+    return int(histogram[[2, 3, 4, 7]].sum())
+
+
+def decode_digits_batch(masks: np.ndarray) -> np.ndarray:
+    # one segment at a time, the signature of an output digit adds
+    # up the pattern counts of its lit segments
+    signatures = np.zeros((len(masks), 4), dtype=np.uint8)
+    for segment in range(len(SEGMENTS)):
+        patterns = (masks[:, :10] >> segment) & 1
+        count = patterns.sum(axis=1, dtype=np.uint8)
+        signatures += ((masks[:, 10:] >> segment) & 1) * count[:, None]
+    digits = SIGNATURE_DIGITS[signatures]
+    if (digits < 0).any():
+        raise ValueError('output digit not found in the signal patterns')
+    return digits @ np.array([1000, 100, 10, 1], dtype=np.int32)
+
+
+def sum_and_decode_digits_batch(masks: np.ndarray) -> int:
+    return int(decode_digits_batch(masks).sum(dtype=np.int64))
+
+
 DISPLAYS = list(map(Display.parse, RAW.splitlines()))
 test_case_sol1 = count_digits_1478(DISPLAYS)
 
 assert test_case_sol1 == 26
 
+assert decode_7sg_digit_signature(DISPLAYS[0]) == 8394
+assert sum_and_decode_digits_signature(DISPLAYS) == 61229
+DISPLAY_MASKS = parse_display_masks(RAW.encode())
+assert DISPLAY_MASKS.shape == (10, 14)
+assert (np.concatenate([parse_chunk_masks(chunk) for chunk in record_chunks(RAW.encode(), 100)])
+        == DISPLAY_MASKS).all()
+assert count_digits_1478_batch(DISPLAY_MASKS) == 26
+assert decode_digits_batch(DISPLAY_MASKS)[0] == 8394
+assert sum_and_decode_digits_batch(DISPLAY_MASKS) == 61229
 assert decode_7sg_digit(DISPLAYS[0]) == 8394
 test_case_sol2 = sum_and_decode_digits(DISPLAYS)
 assert test_case_sol2 == 61229
@@ -122,4 +249,9 @@ if __name__ == '__main__':
     print('contest sol part 2')
     print(contest_sol_part2)
     assert contest_sol_part2 == 1012089
+    assert sum_and_decode_digits_signature(contest_displays) == contest_sol_part2
+
+    contest_masks = parse_display_masks(contest_raw.encode())
+    assert count_digits_1478_batch(contest_masks) == contest_sol_part1
+    assert sum_and_decode_digits_batch(contest_masks) == contest_sol_part2
 
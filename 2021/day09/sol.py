@@ -1,5 +1,7 @@
 from typing import List, Tuple
+from functools import cached_property
 import math
+import numpy as np
 
 RAW = """
 2199943210
@@ -70,6 +72,37 @@ class Heightmap:
 
 
 
+class ArrayHeightmap:
+    def __init__(self, raw: str):
+        data = raw.strip().replace('\r\n', '\n').encode() + b'\n'
+        width = data.index(b'\n')
+        if (len(data) % (width + 1) or data.count(b'\n') != len(data) // (width + 1)
+                or data[width::width + 1].strip(b'\n')):
+            raise ValueError(f'heightmap rows must all be {width} digits long')
+        chars = np.frombuffer(data, dtype=np.uint8).reshape(-1, width + 1)[:, :width]
+        self.map = chars - np.uint8(ord('0'))
+        self.nrows, self.ncols = self.map.shape
+
+    @cached_property
+    def lower_point_mask(self) -> np.ndarray:
+        # compare against the four shifted maps, cells outside the map
+        # never block a lower point
+        m = self.map
+        mask = np.ones(m.shape, dtype=bool)
+        mask[1:, :] &= m[1:, :] < m[:-1, :]
+        mask[:-1, :] &= m[:-1, :] < m[1:, :]
+        mask[:, 1:] &= m[:, 1:] < m[:, :-1]
+        mask[:, :-1] &= m[:, :-1] < m[:, 1:]
+        return mask
+
+    def compute_sum_risk_levels(self) -> int:
+        lower_heights = self.map[self.lower_point_mask]
+        return int(lower_heights.sum(dtype=np.int64)) + len(lower_heights)
+
+    def all_lower_points(self) -> List[Tuple[int, int]]:
+        return [(int(i), int(j)) for i, j in np.argwhere(self.lower_point_mask)]
+
+
 HEIGHTMAP = Heightmap(RAW)
 test_case_sol1 = HEIGHTMAP.compute_sum_risk_levels()
 assert test_case_sol1 == 15, test_case_sol1
@@ -77,6 +110,17 @@ assert test_case_sol1 == 15, test_case_sol1
 test_case_sol2 = HEIGHTMAP.three_largest_basin_product()
 assert test_case_sol2 == 1134
 
+ARRAY_HEIGHTMAP = ArrayHeightmap(RAW)
+assert ARRAY_HEIGHTMAP.compute_sum_risk_levels() == 15
+assert ARRAY_HEIGHTMAP.all_lower_points() == HEIGHTMAP.all_lower_points()
+assert ArrayHeightmap(RAW.replace('\n', '\r\n')).compute_sum_risk_levels() == 15
+for ragged in ['2199\n398\n98567', '219\n39\n\n985']:
+    try:
+        ArrayHeightmap(ragged)
+        raise AssertionError(f'{ragged!r} should not parse')
+    except ValueError:
+        pass
+
 
 
 if __name__ == '__main__':
@@ -87,6 +131,9 @@ if __name__ == '__main__':
 
     contest_sol_par1 = contest_heightmap.compute_sum_risk_levels()
     print(contest_sol_par1)
+    contest_array_heightmap = ArrayHeightmap(contest_raw)
+    assert contest_array_heightmap.compute_sum_risk_levels() == contest_sol_par1
+    assert contest_array_heightmap.all_lower_points() == contest_heightmap.all_lower_points()
 
     contest_sol_par2 = contest_heightmap.three_largest_basin_product()
     print(contest_sol_par2)
@@ -1,5 +1,6 @@
-from typing import Iterable, Dict, List, Set, Callable
+from typing import Iterable, Dict, List, Set, Callable, Tuple, Iterator, Optional
 from collections import defaultdict, Counter, deque
+from functools import lru_cache
 
 
 RAW = ["""start-A
@@ -88,12 +89,140 @@ def find_all_paths(caves: Dict[str, List[str]],
     return total_path_count
 
 
+def iter_all_paths(caves: Dict[str, List[str]],
+                   start: str = 'start',
+                   end: str = 'end',
+                   allow_visit_twice: bool = False,
+                   limit: Optional[int] = None,
+                   predicate: Optional[Callable[[Tuple[str, ...]], bool]] = None,
+                   ) -> Iterator[Tuple[str, ...]]:
+    """
+    Depth first walk yielding every complete path, with a single path stack
+    and backtracking, so memory is proportional to the path length.
+    """
+    path = [start]
+    # a stack of neighbor iterators, one per cave in the path
+    neighbors = [iter(caves[start])]
+    visits = defaultdict(int)
+    twice_cave = None
+    n_paths = 0
+    if limit is not None and limit <= 0:
+        return
+
+    while neighbors:
+        next_cave = next(neighbors[-1], None)
+        if next_cave is None:
+            neighbors.pop()
+            cave = path.pop()
+            if not is_big_cave(cave):
+                visits[cave] -= 1
+                if cave == twice_cave:
+                    twice_cave = None
+            continue
+
+        if next_cave == start:
+            continue
+        if next_cave == end:
+            complete_path = tuple(path) + (end,)
+            if predicate is None or predicate(complete_path):
+                yield complete_path
+                n_paths += 1
+                if n_paths == limit:
+                    return
+            continue
+
+        if not is_big_cave(next_cave):
+            if visits[next_cave] and (twice_cave is not None or not allow_visit_twice):
+                continue
+            if visits[next_cave]:
+                twice_cave = next_cave
+            visits[next_cave] += 1
+        path.append(next_cave)
+        neighbors.append(iter(caves[next_cave]))
+
+
+def contract_big_caves(caves: Dict[str, List[str]]) -> Tuple[List[str], List[List[Tuple[int, int]]]]:
+    """
+    Number the small caves and replace every big cave by weighted edges
+    between its small neighbors, a small cave is connected to itself through
+    each big cave it touches.
+    """
+    small_caves = sorted(cave for cave in caves if not is_big_cave(cave))
+    index = {cave: i for i, cave in enumerate(small_caves)}
+    weights = [Counter() for _ in small_caves]
+
+    for cave, neighbors in caves.items():
+        if is_big_cave(cave):
+            if any(is_big_cave(n) for n in neighbors):
+                raise ValueError(f'big cave {cave} connected to a big cave, infinite paths')
+            for u in neighbors:
+                for v in neighbors:
+                    weights[index[u]][index[v]] += 1
+        else:
+            for n in neighbors:
+                if not is_big_cave(n):
+                    weights[index[cave]][index[n]] += 1
+
+    edges = [sorted(w.items()) for w in weights]
+    return small_caves, edges
+
+
+def count_all_paths(caves: Dict[str, List[str]],
+                    start: str = 'start',
+                    end: str = 'end',
+                    allow_visit_twice: bool = False) -> int:
+    small_caves, edges = contract_big_caves(caves)
+    start_idx = small_caves.index(start)
+    end_idx = small_caves.index(end)
+
+    @lru_cache(maxsize=None)
+    def _count(cave: int, visited: int, visited_twice: bool) -> int:
+        if cave == end_idx:
+            return 1
+        count = 0
+        for next_cave, weight in edges[cave]:
+            if next_cave == start_idx:
+                continue
+            bit = 1 << next_cave
+            if not visited & bit:
+                count += weight * _count(next_cave, visited | bit, visited_twice)
+            elif not visited_twice:
+                count += weight * _count(next_cave, visited, True)
+        return count
+
+    return _count(start_idx, 1 << start_idx, not allow_visit_twice)
+
+
 for i, raw_string in enumerate(RAW):
     CAVES = build_cave_map(raw_string)
     max_n_paths = find_all_paths(CAVES, allow_visit_twice=False)
     assert max_n_paths == expected_sol1[i], max_n_paths
     max_n_paths_twice = find_all_paths(CAVES, allow_visit_twice=True)
     assert max_n_paths_twice == expected_sol2[i], max_n_paths_twice
+    assert count_all_paths(CAVES) == expected_sol1[i]
+    assert count_all_paths(CAVES, allow_visit_twice=True) == expected_sol2[i]
+    for allow_visit_twice, expected in [(False, expected_sol1[i]), (True, expected_sol2[i])]:
+        paths = list(iter_all_paths(CAVES, allow_visit_twice=allow_visit_twice))
+        assert len(paths) == len(set(paths)) == expected
+        assert all(path[0] == 'start' and path[-1] == 'end' for path in paths)
+
+CAVES = build_cave_map(RAW[0])
+assert set(iter_all_paths(CAVES)) == {
+    ('start', 'A', 'b', 'A', 'c', 'A', 'end'), ('start', 'A', 'b', 'A', 'end'),
+    ('start', 'A', 'b', 'end'), ('start', 'A', 'c', 'A', 'b', 'A', 'end'),
+    ('start', 'A', 'c', 'A', 'b', 'end'), ('start', 'A', 'c', 'A', 'end'),
+    ('start', 'A', 'end'), ('start', 'b', 'A', 'c', 'A', 'end'),
+    ('start', 'b', 'A', 'end'), ('start', 'b', 'end')}
+assert len(list(iter_all_paths(CAVES, limit=3))) == 3
+assert len(list(iter_all_paths(CAVES, limit=0))) == 0
+assert len(list(iter_all_paths(CAVES, predicate=lambda path: 'c' in path))) == 5
+
+# two big caves on a complete graph of small caves
+DENSE_CAVES = build_cave_map('\n'.join(
+    [f'{a}-{b}' for a in 'abcdefghij' for b in 'abcdefghij' if a < b] +
+    [f'start-{a}' for a in 'abcde'] + [f'{a}-end' for a in 'fghij'] +
+    [f'{big}-{a}' for big in 'XY' for a in 'abcdefghij']))
+assert count_all_paths(DENSE_CAVES, allow_visit_twice=True) > 10 ** 9
 
 
 if __name__ == '__main__':
@@ -107,3 +236,6 @@ if __name__ == '__main__':
     contest_twice_max_n_paths = find_all_paths(contest_map, allow_visit_twice=True)
     print(contest_twice_max_n_paths)
     assert contest_twice_max_n_paths == 123054
+    assert count_all_paths(contest_map) == contest_max_n_paths
+    assert count_all_paths(contest_map, allow_visit_twice=True) == contest_twice_max_n_paths
+    assert sum(1 for _ in iter_all_paths(contest_map, allow_visit_twice=True)) == contest_twice_max_n_paths
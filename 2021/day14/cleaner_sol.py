@@ -1,5 +1,6 @@
-from typing import Dict, Tuple
+from typing import Dict, Tuple, Optional
 from collections import Counter
+import numpy as np
 
 
 RAW = """NNCB
@@ -54,12 +55,142 @@ def polymerization(polymer: str, rules: Rules, steps: int):
     return most_common_count - least_common_count
 
 
+LIMB_BITS = 16
+
+
+def double_mod(x: np.ndarray, times: int, modulus: int) -> np.ndarray:
+    # x * 2^times % modulus, for uint64 x < modulus < 2^63
+    for _ in range(times):
+        x = x << np.uint64(1)
+        x = np.where(x >= modulus, x - np.uint64(modulus), x)
+    return x
+
+
+def limb_matmul(a: np.ndarray, b: np.ndarray, modulus: int) -> np.ndarray:
+    """
+    a @ b % modulus for modulus < 2^63. Both matrices are split in 16 bit
+    limbs, the limb products are exact in float64 so they run on BLAS, and
+    the limbs are recombined with Horner's rule modulo modulus.
+    """
+    n_limbs = -(-modulus.bit_length() // LIMB_BITS)
+    mask = (1 << LIMB_BITS) - 1
+    a_limbs = [((a >> (LIMB_BITS * i)) & mask).astype(np.float64) for i in range(n_limbs)]
+    b_limbs = [((b >> (LIMB_BITS * i)) & mask).astype(np.float64) for i in range(n_limbs)]
+
+    result = None
+    for k in reversed(range(2 * n_limbs - 1)):
+        limb = sum(a_limbs[i] @ b_limbs[k - i]
+                   for i in range(max(0, k - n_limbs + 1), min(k, n_limbs - 1) + 1))
+        limb = limb.astype(np.uint64) % np.uint64(modulus)
+        if result is None:
+            result = limb
+        else:
+            result = double_mod(result, LIMB_BITS, modulus) + limb
+            result = np.where(result >= modulus, result - np.uint64(modulus), result)
+    return result.astype(np.int64)
+
+
+def matmul(a: np.ndarray, b: np.ndarray, modulus: Optional[int] = None) -> np.ndarray:
+    if modulus is None:
+        return a.astype(object) @ b.astype(object)
+    if modulus >= 1 << 63:
+        return (a.astype(object) @ b.astype(object)) % modulus
+    if modulus >= 1 << 31:
+        return limb_matmul(a, b, modulus)
+    # split b in 16 bit halves so the int64 products never overflow
+    b_high, b_low = b >> 16, b & 0xFFFF
+    high = (a @ b_high) % modulus
+    return ((high << 16) + a @ b_low) % modulus
+
+
+class PairTransitionMatrix:
+    """
+    Insertion rules compiled to an integer matrix over pair counts, column j
+    holds the pairs produced by the pair j in one step. Pairs without a rule
+    are kept as they are.
+    """
+    def __init__(self, rules: Rules):
+        self.elements = sorted(set(''.join(rules)) | set(rules.values()))
+        self.element_index = {e: i for i, e in enumerate(self.elements)}
+        self.pairs = [a + b for a in self.elements for b in self.elements]
+        self.pair_index = {pair: i for i, pair in enumerate(self.pairs)}
+
+        n_pairs = len(self.pairs)
+        self.matrix = np.zeros((n_pairs, n_pairs), dtype=np.int64)
+        for pair, j in self.pair_index.items():
+            if pair in rules:
+                element = rules[pair]
+                self.matrix[self.pair_index[pair[0] + element], j] += 1
+                self.matrix[self.pair_index[element + pair[1]], j] += 1
+            else:
+                self.matrix[j, j] += 1
+
+    def pair_vector(self, polymer: str) -> np.ndarray:
+        unknown = set(polymer) - set(self.elements)
+        if unknown:
+            raise ValueError(f'elements without rules: {sorted(unknown)}')
+        vector = np.zeros((len(self.pairs), 1), dtype=np.int64)
+        for pair, count in polymeter_to_pair_count(polymer).items():
+            vector[self.pair_index[pair], 0] = count
+        return vector
+
+    def element_counts(self, polymer: str, steps: int,
+                       modulus: Optional[int] = None) -> Dict[str, int]:
+        vector = self.pair_vector(polymer)
+        base = self.matrix
+        if modulus is not None:
+            if modulus >= 1 << 63:
+                vector, base = vector.astype(object), base.astype(object)
+            vector, base = vector % modulus, base % modulus
+        # repeated squaring, the vector is multiplied by M^(2^k) for each set bit
+        while steps:
+            if steps & 1:
+                vector = matmul(base, vector, modulus)
+            steps >>= 1
+            if steps:
+                base = matmul(base, base, modulus)
+
+        # every element is the first one of a pair, except the last one
+        # of the polymer which never changes
+        counts = Counter({e: 0 for e in self.elements})
+        for pair, count in zip(self.pairs, vector[:, 0]):
+            counts[pair[0]] += int(count)
+        counts[polymer[-1]] += 1
+        if modulus is None:
+            return +counts
+        # every element is kept, a count can be a multiple of the modulus
+        return Counter({e: c % modulus for e, c in counts.items()})
+
+
+def polymerization_matrix(polymer: str, rules: Rules, steps: int) -> int:
+    element_count = PairTransitionMatrix(rules).element_counts(polymer, steps)
+    sorted_counts = element_count.most_common()
+    return sorted_counts[0][1] - sorted_counts[-1][1]
+
+
 POLYMETER, RULES = parse_input(RAW)
 test_case_sol1 = polymerization(POLYMETER, RULES, 10)
 assert test_case_sol1 == 1588
 
 test_case_sol2 = polymerization(POLYMETER, RULES, 40)
 assert test_case_sol2 == 2188189693529
+
+TRANSITION = PairTransitionMatrix(RULES)
+assert TRANSITION.element_counts(POLYMETER, 0) == Counter(POLYMETER)
+assert TRANSITION.element_counts(POLYMETER, 4) == Counter(
+    'NBBNBNBBCCNBCNCCNBBNBBNBBBNBBNBBCBHCBHHNHCBBCBHCB')
+assert polymerization_matrix(POLYMETER, RULES, 10) == 1588
+assert polymerization_matrix(POLYMETER, RULES, 40) == 2188189693529
+
+PRIME = 1_000_000_007
+EXACT_COUNTS = TRANSITION.element_counts(POLYMETER, 100)
+for modulus in [PRIME, (1 << 31) + 11, (1 << 61) - 1, (1 << 63) - 25, (1 << 89) - 1]:
+    assert TRANSITION.element_counts(POLYMETER, 100, modulus) == {
+        e: EXACT_COUNTS[e] % modulus for e in TRANSITION.elements}
+assert all(0 <= c < PRIME for c in TRANSITION.element_counts(POLYMETER, 10 ** 12, PRIME).values())
+# H appears exactly 161 times after 10 steps
+assert TRANSITION.element_counts(POLYMETER, 10, 161) == {'B': 1749 % 161, 'C': 298 % 161,
+                                                         'H': 0, 'N': 865 % 161}
     
 
 
@@ -71,4 +202,10 @@ if __name__ == '__main__':
     print(contest_sol_part1)
 
     contest_sol_part2 =polymerization(contest_polymeter, contest_rules, 40)
-    print(contest_sol_part2)
\ No newline at end of file
+    print(contest_sol_part2)
+    assert polymerization_matrix(contest_polymeter, contest_rules, 40) == contest_sol_part2
+    contest_transition = PairTransitionMatrix(contest_rules)
+    contest_exact = contest_transition.element_counts(contest_polymeter, 200)
+    for modulus in [PRIME, (1 << 61) - 1]:
+        assert contest_transition.element_counts(contest_polymeter, 200, modulus) == {
+            e: contest_exact[e] % modulus for e in contest_transition.elements}
\ No newline at end of file
@@ -1,4 +1,5 @@
-from typing import Dict, Counter
+from typing import Dict, Counter, NamedTuple, Iterator, Optional
+import numpy as np
 
 RAW = """NNCB
 
@@ -55,6 +56,94 @@ class Polymerization:
 
 
 
+class PolymerState(NamedTuple):
+    step: int
+    pair_count: np.ndarray
+    element_count: np.ndarray
+
+
+class VectorPolymerization:
+    """
+    Same as Polymerization with pairs and elements mapped to dense indexes.
+    Every step builds new count arrays, so the yielded states are snapshots.
+    Counts are python ints by default, a fixed width integer dtype is faster
+    but step raises OverflowError before a count could wrap around.
+    """
+    def __init__(self, polymer: str, insection_pairs: Dict[str, str], dtype=object):
+        self.elements = sorted(set(polymer) | set(''.join(insection_pairs))
+                               | set(insection_pairs.values()))
+        self.element_index = {e: i for i, e in enumerate(self.elements)}
+        self.pairs = [a + b for a in self.elements for b in self.elements]
+        self.pair_index = {pair: i for i, pair in enumerate(self.pairs)}
+
+        # each rule sends the count of its pair to two target pairs
+        # and inserts one element
+        rule_pairs = list(insection_pairs)
+        sources = np.array([self.pair_index[pair] for pair in rule_pairs], dtype=np.intp)
+        left = [self.pair_index[pair[0] + insection_pairs[pair]] for pair in rule_pairs]
+        right = [self.pair_index[insection_pairs[pair] + pair[1]] for pair in rule_pairs]
+        self.sources = np.concatenate([sources, sources])
+        self.targets = np.array(left + right, dtype=np.intp)
+        self.inserted = np.array([self.element_index[insection_pairs[pair]]
+                                  for pair in rule_pairs], dtype=np.intp)
+        self.rule_sources = sources
+
+        pair_count = np.zeros(len(self.pairs), dtype=dtype)
+        for pair, count in polymeter_to_pair_count(polymer).items():
+            pair_count[self.pair_index[pair]] = count
+        element_count = np.zeros(len(self.elements), dtype=dtype)
+        for element, count in Counter(polymer).items():
+            element_count[self.element_index[element]] = count
+        self.state = PolymerState(0, pair_count, element_count)
+        self.max_count = (int(np.iinfo(dtype).max)
+                          if np.issubdtype(dtype, np.integer) else None)
+
+    def check_overflow(self) -> None:
+        # the number of pairs at most doubles in one step and every new
+        # element comes from one pair, so no count can pass the new totals
+        pair_total = int(self.state.pair_count.sum(dtype=object))
+        element_total = int(self.state.element_count.sum(dtype=object))
+        if pair_total > self.max_count // 2 or element_total + pair_total > self.max_count:
+            raise OverflowError(f'counts after step {self.state.step + 1} may not fit in '
+                                f'{self.state.pair_count.dtype}, use dtype=object')
+
+    def step(self) -> PolymerState:
+        if self.max_count is not None:
+            self.check_overflow()
+        pair_count = np.zeros_like(self.state.pair_count)
+        np.add.at(pair_count, self.targets, self.state.pair_count[self.sources])
+        element_count = self.state.element_count.copy()
+        np.add.at(element_count, self.inserted, self.state.pair_count[self.rule_sources])
+        self.state = PolymerState(self.state.step + 1, pair_count, element_count)
+        return self.state
+
+    def iter_steps(self, nsteps: Optional[int] = None) -> Iterator[PolymerState]:
+        while nsteps is None or nsteps > 0:
+            yield self.step()
+            if nsteps is not None:
+                nsteps -= 1
+
+    def pair_counter(self, state: Optional[PolymerState] = None) -> Counter:
+        state = self.state if state is None else state
+        return Counter({self.pairs[i]: int(state.pair_count[i])
+                        for i in np.flatnonzero(state.pair_count)})
+
+    def element_counter(self, state: Optional[PolymerState] = None) -> Counter:
+        state = self.state if state is None else state
+        return Counter({self.elements[i]: int(state.element_count[i])
+                        for i in np.flatnonzero(state.element_count)})
+
+    def compute_most_least_common_difference(self) -> int:
+        present = self.state.element_count[self.state.element_count > 0]
+        return int(present.max() - present.min())
+
+    @staticmethod
+    def parse(raw_string: str, dtype=object) -> 'VectorPolymerization':
+        polymer_template, raw_insection_pairs = raw_string.strip().split('\n\n')
+        insection_pairs = dict(row.split(' -> ') for row in raw_insection_pairs.splitlines())
+        return VectorPolymerization(polymer_template, insection_pairs, dtype)
+
+
 EXPECTED_SOL1 = ['NCNBCHB', 'NBCCNBBBCBHCB',
                  'NBBBCNCCNBBNBNBBCHBHHBCHB',
                  'NBBNBNBBCCNBCNCCNBBNBBNBBBNBBNBBCBHCBHHNHCBBCBHCB']
@@ -76,6 +165,41 @@ for _ in range(30):
     POLYMETER.step()
 test_case_sol2 = POLYMETER.compute_most_least_common_difference()
 assert test_case_sol2 == 2188189693529
+
+VECTOR_POLYMETER = VectorPolymerization.parse(RAW)
+STATES = list(VECTOR_POLYMETER.iter_steps(len(EXPECTED_SOL1)))
+for i, state in enumerate(STATES):
+    assert state.step == i + 1
+    assert VECTOR_POLYMETER.element_counter(state) == Counter(EXPECTED_SOL1[i])
+    assert VECTOR_POLYMETER.pair_counter(state) == polymeter_to_pair_count(EXPECTED_SOL1[i])
+
+for _ in VECTOR_POLYMETER.iter_steps(6):
+    pass
+assert VECTOR_POLYMETER.compute_most_least_common_difference() == 1588
+
+for _ in VECTOR_POLYMETER.iter_steps(30):
+    pass
+assert VECTOR_POLYMETER.compute_most_least_common_difference() == 2188189693529
+assert VECTOR_POLYMETER.element_counter() == POLYMETER.element_count
+
+EXACT_POLYMETER = VectorPolymerization.parse(RAW)
+for _ in range(60):
+    POLYMETER.step()
+for _ in EXACT_POLYMETER.iter_steps(100):
+    pass
+assert EXACT_POLYMETER.compute_most_least_common_difference() > 1 << 64
+assert EXACT_POLYMETER.element_counter() == POLYMETER.element_count
+
+INT64_POLYMETER = VectorPolymerization.parse(RAW, dtype=np.int64)
+for _ in INT64_POLYMETER.iter_steps(40):
+    pass
+assert INT64_POLYMETER.compute_most_least_common_difference() == 2188189693529
+try:
+    for _ in INT64_POLYMETER.iter_steps(60):
+        pass
+    raise AssertionError('int64 counts should overflow before 100 steps')
+except OverflowError:
+    pass
     
 
 
@@ -91,4 +215,16 @@ if __name__ == '__main__':
     for _ in range(30):
         contest_polymeter.step()
     contest_sol_part2 = contest_polymeter.compute_most_least_common_difference()
-    print(contest_sol_part2)
\ No newline at end of file
+    print(contest_sol_part2)
+
+    contest_vector_polymeter = VectorPolymerization.parse(contest_raw)
+    for _ in contest_vector_polymeter.iter_steps(40):
+        pass
+    assert contest_vector_polymeter.compute_most_least_common_difference() == contest_sol_part2
+
+    for _ in range(30):
+        contest_polymeter.step()
+    for _ in contest_vector_polymeter.iter_steps(30):
+        pass
+    assert (contest_vector_polymeter.compute_most_least_common_difference()
+            == contest_polymeter.compute_most_least_common_difference())
\ No newline at end of file
@@ -1,7 +1,15 @@
-from typing import List, Iterable, Tuple
+from typing import List, Iterable, Tuple, Union, NamedTuple
 from collections import deque, defaultdict
+from array import array
 
 XY = Tuple[int, int]
+MAX_RISK = 9
+# distance of the cells not reached yet, distances are kept in array('I')
+UNREACHED = (1 << 32) - 1
+# translation tables shifting a risk byte by k, wrapping 9 -> 1
+SHIFT_TABLES = [bytes((v - 1 + k) % MAX_RISK + 1 if 1 <= v <= MAX_RISK else v
+                      for v in range(256))
+                for k in range(MAX_RISK)]
 RAW = """1163751742
 1381373672
 2136511328
@@ -19,6 +27,7 @@ class Grid:
         self.expand_dim = expand_dim
         assert len(self.grid) == len(self.grid[0])
         self.size = len(self.grid)
+        self.rows = [bytes(row) for row in self.grid]
     
     def __len__(self) -> int:
         return self.expand_dim * self.size
@@ -49,12 +58,92 @@ class Grid:
             if 0 <= ii < len(self) and 0 <= jj < len(self):
                 yield (ii, jj)
 
+    def expanded_row(self, i: int) -> bytes:
+        # the tile (ti, tj) is the base tile shifted by ti + tj
+        ti, ii = divmod(i, self.size)
+        row = self.rows[ii]
+        return b''.join(row.translate(SHIFT_TABLES[(ti + tj) % MAX_RISK])
+                        for tj in range(self.expand_dim))
+
+    def min_risk(self) -> int:
+        # tiles are shifted by 0 .. 2 * (expand_dim - 1)
+        n_shifts = min(MAX_RISK, 2 * self.expand_dim - 1)
+        return min(min(row.translate(SHIFT_TABLES[k]))
+                   for row in self.rows for k in range(n_shifts))
+
+    def flatten(self, lazy: bool = False) -> 'FlatGrid':
+        # not cached, the buffer is released with the returned FlatGrid
+        return FlatGrid(self, lazy)
+
     @staticmethod
     def parse(raw_string: str, expand_dim: int = 1) -> 'Grid':
         lines = raw_string.strip().splitlines()
         return Grid([[int(x) for x in row] for row in lines], expand_dim)
 
 
+class LazyRisk:
+    """Expanded risk values indexed by flat cell id, building rows on demand.
+
+    Row i only depends on (i % size, (i // size) % MAX_RISK), so at most
+    MAX_RISK * size rows are ever stored, whatever the expand_dim.
+    """
+    def __init__(self, grid: Grid):
+        self.grid = grid
+        self.n = len(grid)
+        size = grid.size
+        self.row_index = [(i % size) + size * ((i // size) % MAX_RISK)
+                          for i in range(self.n)]
+        self.rows = [None] * (size * min(MAX_RISK, grid.expand_dim))
+
+    def __len__(self) -> int:
+        return self.n * self.n
+
+    def row(self, i: int) -> bytes:
+        k = self.row_index[i]
+        row = self.rows[k]
+        if row is None:
+            row = self.rows[k] = self.grid.expanded_row(i)
+        return row
+
+    def __getitem__(self, node: int) -> int:
+        i, j = divmod(node, self.n)
+        row = self.rows[self.row_index[i]]
+        if row is None:
+            row = self.row(i)
+        return row[j]
+
+
+class FlatGrid:
+    """Expanded grid over flat cell ids node = i * n + j.
+
+    With lazy=False the whole expanded tile is materialised in an array('B'),
+    otherwise risk values come from a LazyRisk.
+    """
+    def __init__(self, grid: Grid, lazy: bool = False):
+        n = len(grid)
+        self.n = n
+        self.lazy = lazy
+        self.risk: Union[array, LazyRisk] = (
+            LazyRisk(grid) if lazy else
+            array('B', b''.join(grid.expanded_row(i) for i in range(n))))
+
+        # neighbor offsets for the first, inner and last column
+        # [down, right, left, up]
+        self.neighbor_offsets = [(n, -n, 1), (-1, n, -n, 1), (-1, n, -n)]
+        self.column_class = bytearray([1]) * n
+        self.column_class[0] = 0
+        self.column_class[n - 1] = 2
+
+    def __len__(self) -> int:
+        return self.n
+
+
+class PathResult(NamedTuple):
+    risk: int
+    path: List[XY]
+    expanded: int
+
+
 def find_lowest_risk_path(grid: Grid,
                           start=(0, 0),
                           ) -> int:
@@ -74,6 +163,231 @@ def find_lowest_risk_path(grid: Grid,
     return memo[(size, size)]
 
 
+def find_lowest_risk_path_dial(grid: Grid,
+                               start: XY = (0, 0),
+                               lazy: bool = False,
+                               ) -> int:
+    # Dial's algorithm: risks are in [1, MAX_RISK] so a circular array of
+    # MAX_RISK + 1 buckets is enough to hold every tentative cost
+    flat = grid.flatten(lazy)
+    n = len(flat)
+    risk = flat.risk
+    neighbor_offsets = flat.neighbor_offsets
+    column_class = flat.column_class
+    total = n * n
+    target = total - 1
+    dist = array('I', [UNREACHED]) * total
+    settled = bytearray(total)
+
+    source = start[0] * n + start[1]
+    dist[source] = 0
+    n_buckets = MAX_RISK + 1
+    buckets = [[] for _ in range(n_buckets)]
+    buckets[0].append(source)
+    pending = 1
+    cost = 0
+
+    while pending:
+        bucket = buckets[cost % n_buckets]
+        while bucket:
+            node = bucket.pop()
+            pending -= 1
+            # stale entry, the node was already settled with a lower cost
+            if settled[node]:
+                continue
+            settled[node] = 1
+            if node == target:
+                return cost
+            for offset in neighbor_offsets[column_class[node % n]]:
+                next_node = node + offset
+                if 0 <= next_node < total and not settled[next_node]:
+                    new_cost = cost + risk[next_node]
+                    if new_cost < dist[next_node]:
+                        dist[next_node] = new_cost
+                        buckets[new_cost % n_buckets].append(next_node)
+                        pending += 1
+        cost += 1
+
+    return dist[target]
+
+
+def build_path(pred: array, node: int, n: int) -> List[XY]:
+    path = []
+    while node >= 0:
+        path.append(divmod(node, n))
+        node = pred[node]
+    return path
+
+
+def find_lowest_risk_path_astar(grid: Grid,
+                                start: XY = (0, 0),
+                                lazy: bool = False,
+                                use_heuristic: bool = True,
+                                bidirectional: bool = False,
+                                ) -> PathResult:
+    """
+    A* search to the bottom right corner, using the number of remaining
+    steps times the minimum risk as heuristic. Without heuristic it is a
+    plain Dijkstra search, useful to compare the number of expanded nodes.
+    """
+    if bidirectional:
+        return bidirectional_astar(grid, start, lazy, use_heuristic)
+
+    flat = grid.flatten(lazy)
+    n = len(flat)
+    risk = flat.risk
+    neighbor_offsets = flat.neighbor_offsets
+    column_class = flat.column_class
+    total = n * n
+    target = total - 1
+    min_risk = grid.min_risk() if use_heuristic else 0
+
+    dist = array('I', [UNREACHED]) * total
+    pred = array('i', [-1]) * total
+    closed = bytearray(total)
+
+    # the heuristic is consistent, a step increases f by its risk minus
+    # or plus min_risk, so a circular bucket queue holds every key
+    n_buckets = MAX_RISK + min_risk + 1
+    buckets = [[] for _ in range(n_buckets)]
+    source = start[0] * n + start[1]
+    dist[source] = 0
+    key = min_risk * (2 * (n - 1) - start[0] - start[1])
+    buckets[key % n_buckets].append(source)
+    pending = 1
+    expanded = 0
+
+    while pending:
+        bucket = buckets[key % n_buckets]
+        while bucket:
+            node = bucket.pop()
+            pending -= 1
+            if closed[node]:
+                continue
+            closed[node] = 1
+            expanded += 1
+            if node == target:
+                path = build_path(pred, target, n)[::-1]
+                return PathResult(dist[target], path, expanded)
+            cost = dist[node]
+            h = key - cost
+            for offset in neighbor_offsets[column_class[node % n]]:
+                next_node = node + offset
+                if 0 <= next_node < total and not closed[next_node]:
+                    new_cost = cost + risk[next_node]
+                    if new_cost < dist[next_node]:
+                        dist[next_node] = new_cost
+                        pred[next_node] = node
+                        # right and down get closer to the target
+                        next_h = h - min_risk if offset > 0 else h + min_risk
+                        buckets[(new_cost + next_h) % n_buckets].append(next_node)
+                        pending += 1
+        key += 1
+
+    raise ValueError('target not reachable')
+
+
+def bidirectional_astar(grid: Grid,
+                        start: XY = (0, 0),
+                        lazy: bool = False,
+                        use_heuristic: bool = True,
+                        ) -> PathResult:
+    """
+    Bidirectional A* with the average potential (h_target - h_start) / 2.
+    Keys are doubled to stay integers, the search stops when the sum of the
+    forward and backward keys reaches twice the best path found so far.
+    """
+    flat = grid.flatten(lazy)
+    n = len(flat)
+    risk = flat.risk
+    neighbor_offsets = flat.neighbor_offsets
+    column_class = flat.column_class
+    total = n * n
+    target = total - 1
+    min_risk = grid.min_risk() if use_heuristic else 0
+    si, sj = start
+    source = si * n + sj
+    corner = 2 * (n - 1)
+
+    # the forward cost includes the risk of the node, the backward cost
+    # is the risk of the path from the node to the target excluding it
+    dist_f = array('I', [UNREACHED]) * total
+    dist_b = array('I', [UNREACHED]) * total
+    pred_f = array('i', [-1]) * total
+    succ_b = array('i', [-1]) * total
+    closed_f = bytearray(total)
+    closed_b = bytearray(total)
+
+    # a step changes a doubled key by twice its risk plus at most
+    # 2 * min_risk of potential, in both directions
+    n_buckets = 2 * (MAX_RISK + min_risk) + 1
+    buckets_f = [[] for _ in range(n_buckets)]
+    buckets_b = [[] for _ in range(n_buckets)]
+    dist_f[source] = 0
+    dist_b[target] = 0
+    key_f = min_risk * (corner - si - sj)
+    key_b = min_risk * (abs(n - 1 - si) + abs(n - 1 - sj))
+    buckets_f[key_f % n_buckets].append(source)
+    buckets_b[key_b % n_buckets].append(target)
+    pending_f, pending_b = 1, 1
+    best, meet = (0, source) if source == target else (UNREACHED, -1)
+    expanded = 0
+
+    while pending_f and pending_b:
+        while not buckets_f[key_f % n_buckets]:
+            key_f += 1
+        while not buckets_b[key_b % n_buckets]:
+            key_b += 1
+        if key_f + key_b >= 2 * best:
+            break
+
+        if key_f <= key_b:
+            node = buckets_f[key_f % n_buckets].pop()
+            pending_f -= 1
+            if closed_f[node]:
+                continue
+            closed_f[node] = 1
+            expanded += 1
+            cost = dist_f[node]
+            for offset in neighbor_offsets[column_class[node % n]]:
+                next_node = node + offset
+                if 0 <= next_node < total and not closed_f[next_node]:
+                    new_cost = cost + risk[next_node]
+                    if new_cost < dist_f[next_node]:
+                        dist_f[next_node] = new_cost
+                        pred_f[next_node] = node
+                        i, j = divmod(next_node, n)
+                        potential = min_risk * (corner - i - j - abs(i - si) - abs(j - sj))
+                        buckets_f[(2 * new_cost + potential) % n_buckets].append(next_node)
+                        pending_f += 1
+                        if new_cost + dist_b[next_node] < best:
+                            best, meet = new_cost + dist_b[next_node], next_node
+        else:
+            node = buckets_b[key_b % n_buckets].pop()
+            pending_b -= 1
+            if closed_b[node]:
+                continue
+            closed_b[node] = 1
+            expanded += 1
+            # every edge into the node costs its risk
+            new_cost = dist_b[node] + risk[node]
+            for offset in neighbor_offsets[column_class[node % n]]:
+                prev_node = node + offset
+                if 0 <= prev_node < total and not closed_b[prev_node]:
+                    if new_cost < dist_b[prev_node]:
+                        dist_b[prev_node] = new_cost
+                        succ_b[prev_node] = node
+                        i, j = divmod(prev_node, n)
+                        potential = min_risk * (corner - i - j - abs(i - si) - abs(j - sj))
+                        buckets_b[(2 * new_cost - potential) % n_buckets].append(prev_node)
+                        pending_b += 1
+                        if dist_f[prev_node] + new_cost < best:
+                            best, meet = dist_f[prev_node] + new_cost, prev_node
+
+    path = build_path(pred_f, meet, n)[::-1] + build_path(succ_b, meet, n)[1:]
+    return PathResult(best, path, expanded)
+
+
 GRID = Grid.parse(RAW)
 test_case_sol1 = find_lowest_risk_path(GRID)
 assert test_case_sol1 == 40
@@ -83,6 +397,29 @@ GRID_5X5 = Grid.parse(RAW, expand_dim=5)
 test_case_sol2 = find_lowest_risk_path(GRID_5X5)
 test_case_sol2 == 315
 
+assert find_lowest_risk_path_dial(GRID) == 40
+assert find_lowest_risk_path_dial(GRID_5X5) == 315
+assert find_lowest_risk_path_dial(GRID_5X5, lazy=True) == 315
+EXPANDED_RISK = [GRID_5X5[(i, j)]
+                 for i in range(len(GRID_5X5))
+                 for j in range(len(GRID_5X5))]
+assert list(GRID_5X5.flatten().risk) == EXPANDED_RISK
+LAZY_RISK = GRID_5X5.flatten(lazy=True).risk
+assert [LAZY_RISK[node] for node in range(len(LAZY_RISK))] == EXPANDED_RISK
+
+for bidirectional in (False, True):
+    for use_heuristic in (False, True):
+        for grid, expected in [(GRID, 40), (GRID_5X5, 315)]:
+            result = find_lowest_risk_path_astar(grid,
+                                                 use_heuristic=use_heuristic,
+                                                 bidirectional=bidirectional)
+            assert result.risk == expected, result.risk
+            assert result.path[0] == (0, 0)
+            assert result.path[-1] == (len(grid) - 1, len(grid) - 1)
+            assert sum(grid[pos] for pos in result.path[1:]) == expected
+            assert all(abs(i - ii) + abs(j - jj) == 1
+                       for (i, j), (ii, jj) in zip(result.path, result.path[1:]))
+
 
 if __name__ == '__main__':
     with  open('data/input.txt') as f:
@@ -99,3 +436,4 @@ if __name__ == '__main__':
     print('contest sol part 2')
     print(contest_sol2)
     assert contest_sol2 == 2979
+    assert find_lowest_risk_path_dial(contest_grid_5x5) == contest_sol2
@@ -1,4 +1,5 @@
-
+from typing import List, Tuple, NamedTuple, Iterable, Iterator, Optional
+from array import array
 
 
 def hex_to_bin_encoding(hex_rep: str) -> str:
@@ -11,97 +12,116 @@ def hex_to_bin_encoding(hex_rep: str) -> str:
 
 
 class Packet:
+    __slots__ = ('start_bit', 'end_bit', 'version', 'packet_type', 'sub_packets',
+                 'literal_value')
 
     def __init__(self, start_bit=0):
         self.start_bit = start_bit
-        self.bits = ''
         self.version = None
         self.packet_type = None
         self.sub_packets = list()
 
+        self.end_bit = start_bit
+
         self.literal_value = 0
-        self.padding = None
 
     def __len__(self):
-        return len(self.bits)
+        return self.end_bit - self.start_bit
 
     @property
     def version_sum(self):
-        vs = int(self.version, 2)
-        for sub_packet in self.sub_packets:
-            vs += sub_packet.version_sum
-
-        return vs
+        return evaluate(self)[0]
 
     @property
     def value(self):
-        packet_type = int(self.packet_type, 2)
-
-        if packet_type == 0:
-            """
-            Packets with type ID 0 are sum packets - 
-            their value is the sum of the values of their sub-packets. 
-            If they only have a single sub-packet, their value is the value of the sub-packet.
-            """
-            return sum(sub.value for sub in self.sub_packets)
-
-        if packet_type == 1:
-            """
-            Packets with type ID 1 are product packets - 
-            their value is the result of multiplying together the values of their sub-packets.
-             If they only have a single sub-packet, their value is the value of the sub-packet.
-            """
-            v = 1
-            for s in self.sub_packets:
-                v *= s.value
-            return v
-
-        if packet_type == 2:
-            """
-            Packets with type ID 2 are minimum packets - 
-            their value is the minimum of the values of their sub-packets.
-            """
-            return min(sub.value for sub in self.sub_packets)
-
-        if packet_type == 3:
-            """
-            Packets with type ID 3 are maximum packets - 
-            their value is the maximum of the values of their sub-packets.
-            """
-            return max(sub.value for sub in self.sub_packets)
-
-        if packet_type == 4:
-            """
-            Literal values (type ID 4) represent a single number as described above. 
-            """
-            return self.literal_value
-
-        if packet_type == 5:
-            """
-            Packets with type ID 5 are greater than packets - 
-            their value is 1 if the value of the first sub-packet is greater than the value of the second sub-packet; 
-            otherwise, their value is 0. These packets always have exactly two sub-packets.
-            """
-            return 1 if self.sub_packets[0].value > self.sub_packets[1].value else 0
-
-        if packet_type == 6:
-            """
-            Packets with type ID 6 are less than packets - 
-            their value is 1 if the value of the first sub-packet is less than the value of the second sub-packet; 
-            otherwise, their value is 0. These packets always have exactly two sub-packets.
-            """
-            return 1 if self.sub_packets[0].value < self.sub_packets[1].value else 0
-
-        if packet_type == 7:
-            """
-            Packets with type ID 7 are equal to packets -
-             their value is 1 if the value of the first sub-packet is equal to the value of the second sub-packet; 
-             otherwise, their value is 0. These packets always have exactly two sub-packets.
-            """
-            return 1 if self.sub_packets[0].value == self.sub_packets[1].value else 0
-
+        return evaluate(self)[1]
+
+
+def packet_value(packet_type: int, literal_value: int, sub_values: List[int]) -> int:
+    if packet_type == 0:
+        """
+        Packets with type ID 0 are sum packets - 
+        their value is the sum of the values of their sub-packets. 
+        If they only have a single sub-packet, their value is the value of the sub-packet.
+        """
+        return sum(sub_values)
+
+    if packet_type == 1:
+        """
+        Packets with type ID 1 are product packets - 
+        their value is the result of multiplying together the values of their sub-packets.
+         If they only have a single sub-packet, their value is the value of the sub-packet.
+        """
+        v = 1
+        for s in sub_values:
+            v *= s
+        return v
+
+    if packet_type == 2:
+        """
+        Packets with type ID 2 are minimum packets - 
+        their value is the minimum of the values of their sub-packets.
+        """
+        return min(sub_values)
+
+    if packet_type == 3:
+        """
+        Packets with type ID 3 are maximum packets - 
+        their value is the maximum of the values of their sub-packets.
+        """
+        return max(sub_values)
+
+    if packet_type == 4:
+        """
+        Literal values (type ID 4) represent a single number as described above. 
+        """
+        return literal_value
+
+    if packet_type == 5:
+        """
+        Packets with type ID 5 are greater than packets - 
+        their value is 1 if the value of the first sub-packet is greater than the value of the second sub-packet; 
+        otherwise, their value is 0. These packets always have exactly two sub-packets.
+        """
+        return 1 if sub_values[0] > sub_values[1] else 0
+
+    if packet_type == 6:
+        """
+        Packets with type ID 6 are less than packets - 
+        their value is 1 if the value of the first sub-packet is less than the value of the second sub-packet; 
+        otherwise, their value is 0. These packets always have exactly two sub-packets.
+        """
+        return 1 if sub_values[0] < sub_values[1] else 0
+
+    if packet_type == 7:
+        """
+        Packets with type ID 7 are equal to packets -
+         their value is 1 if the value of the first sub-packet is equal to the value of the second sub-packet; 
+         otherwise, their value is 0. These packets always have exactly two sub-packets.
+        """
+        return 1 if sub_values[0] == sub_values[1] else 0
+
+    else:
+        raise NotImplementedError("Packet type:", packet_type)
+
+
+def evaluate(root: Packet) -> Tuple[int, int]:
+    """Post-order walk with an explicit stack, returns the version sum and value."""
+    version_sum = 0
+    values = []
+    stack = [(root, False)]
+    while stack:
+        packet, children_done = stack.pop()
+        if children_done:
+            n_values = len(values) - len(packet.sub_packets)
+            sub_values = values[n_values:]
+            del values[n_values:]
+            values.append(packet_value(packet.packet_type, packet.literal_value, sub_values))
         else:
-            raise NotImplementedError("Packet type:", packet_type)
+            version_sum += packet.version
+            stack.append((packet, True))
+            stack.extend((sub, False) for sub in reversed(packet.sub_packets))
+    return version_sum, values[0]
 
 
 def extract_from_hex(hex_seq):
@@ -118,8 +138,8 @@ def extract_from_bin(bit_seq: int):
 
         # Instantiate a Packet
         packet = Packet(pointer)
-        packet.version = pv
-        packet.packet_type = pt
+        packet.version = int(pv, 2)
+        packet.packet_type = int(pt, 2)
         pointer += 6
 
         # If it's a literal, our values are already here
@@ -130,7 +150,7 @@ def extract_from_bin(bit_seq: int):
                 pointer += 5
                 group_val += group[1:]
                 if group[0] == '0':
-                    packet.bits = bit_seq[packet.start_bit:pointer]
+                    packet.end_bit = pointer
                     packet.literal_value = int(group_val, 2)
                     return packet
 
@@ -163,11 +183,382 @@ def extract_from_bin(bit_seq: int):
                     pointer += len(sub_pack)
                 packet.sub_packets = sub_packets
 
-        packet.bits = bit_seq[packet.start_bit:pointer]
+        packet.end_bit = pointer
 
         return packet
 
 
+class BitReader:
+    """Reads big endian bit fields from raw bytes, moving a cursor."""
+
+    def __init__(self, data: bytes, nbits: Optional[int] = None):
+        self.data = memoryview(data)
+        self.nbits = len(data) * 8 if nbits is None else nbits
+        self.pos = 0
+
+    def __len__(self):
+        return self.nbits
+
+    def read(self, width: int) -> int:
+        end = self.pos + width
+        if end > self.nbits:
+            raise EOFError(f'cannot read {width} bits at position {self.pos}')
+        first = self.pos >> 3
+        last = (end + 7) >> 3
+        chunk = int.from_bytes(self.data[first:last], 'big')
+        self.pos = end
+        return (chunk >> ((last << 3) - end)) & ((1 << width) - 1)
+
+    @staticmethod
+    def from_hex(hex_seq: str) -> 'BitReader':
+        hex_seq = hex_seq.strip()
+        nbits = 4 * len(hex_seq)
+        if len(hex_seq) % 2:
+            hex_seq += '0'
+        return BitReader(bytes.fromhex(hex_seq), nbits)
+
+
+def extract_from_reader(reader: BitReader) -> Packet:
+    packet = Packet(reader.pos)
+    packet.version = reader.read(3)
+    packet.packet_type = reader.read(3)
+
+    if packet.packet_type == 4:
+        literal_value = 0
+        while True:
+            group = reader.read(5)
+            literal_value = (literal_value << 4) | (group & 0b1111)
+            if not group & 0b10000:
+                break
+        packet.literal_value = literal_value
+
+    elif reader.read(1) == 0:  # length reps number of bits
+        sub_pack_length = reader.read(15)
+        end_bit = reader.pos + sub_pack_length
+        while reader.pos < end_bit:
+            packet.sub_packets.append(extract_from_reader(reader))
+
+    else:  # length reps number of packets
+        sub_pack_count = reader.read(11)
+        for _ in range(sub_pack_count):
+            packet.sub_packets.append(extract_from_reader(reader))
+
+    packet.end_bit = reader.pos
+    return packet
+
+
+def parse_packets(reader: BitReader) -> Packet:
+    """Same as extract_from_reader, keeping the open operator packets in a stack."""
+    root = None
+    # [packet, length_type_id, end bit or number of sub packets]
+    stack = []
+    while True:
+        packet = Packet(reader.pos)
+        packet.version = reader.read(3)
+        packet.packet_type = reader.read(3)
+        if stack:
+            stack[-1][0].sub_packets.append(packet)
+        else:
+            root = packet
+
+        if packet.packet_type == 4:
+            literal_value = 0
+            while True:
+                group = reader.read(5)
+                literal_value = (literal_value << 4) | (group & 0b1111)
+                if not group & 0b10000:
+                    break
+            packet.literal_value = literal_value
+            packet.end_bit = reader.pos
+        elif reader.read(1) == 0:  # length reps number of bits
+            sub_pack_length = reader.read(15)
+            stack.append([packet, 0, reader.pos + sub_pack_length])
+        else:  # length reps number of packets
+            stack.append([packet, 1, reader.read(11)])
+
+        # close every operator whose sub packets are complete
+        while stack:
+            parent, length_type_id, limit = stack[-1]
+            if length_type_id == 0 and reader.pos < limit:
+                break
+            if length_type_id == 1 and len(parent.sub_packets) < limit:
+                break
+            parent.end_bit = reader.pos
+            stack.pop()
+
+        if not stack:
+            return root
+
+
+class PacketTree:
+    """
+    Packets stored in parallel arrays, indexed in parse (pre-order) order,
+    so the root is node 0 and every sub packet comes after its parent.
+    """
+    NO_NODE = -1
+
+    def __init__(self):
+        self.version = array('B')
+        self.packet_type = array('B')
+        self.literal_value = array('Q')
+        self.first_child = array('q')
+        self.next_sibling = array('q')
+        self.start_bit = array('Q')
+        self.length = array('Q')
+        # literals that do not fit in 64 bits
+        self.big_literals = {}
+
+    def __len__(self) -> int:
+        return len(self.version)
+
+    def add(self, version: int, packet_type: int, start_bit: int) -> int:
+        self.version.append(version)
+        self.packet_type.append(packet_type)
+        self.literal_value.append(0)
+        self.first_child.append(self.NO_NODE)
+        self.next_sibling.append(self.NO_NODE)
+        self.start_bit.append(start_bit)
+        self.length.append(0)
+        return len(self.version) - 1
+
+    def set_literal(self, node: int, literal_value: int) -> None:
+        if literal_value >> 64:
+            self.big_literals[node] = literal_value
+        else:
+            self.literal_value[node] = literal_value
+
+    def get_literal(self, node: int) -> int:
+        return self.big_literals.get(node, self.literal_value[node])
+
+    def sub_packets(self, node: int) -> Iterator[int]:
+        child = self.first_child[node]
+        while child != self.NO_NODE:
+            yield child
+            child = self.next_sibling[child]
+
+    def subtree_end(self, node: int) -> int:
+        # follow the last sub packet down to the last node of the subtree
+        child = self.first_child[node]
+        while child != self.NO_NODE:
+            node = child
+            sibling = self.next_sibling[child]
+            child = self.first_child[child] if sibling == self.NO_NODE else sibling
+        return node + 1
+
+    def version_sum(self, node: int = 0) -> int:
+        return sum(self.version[node:self.subtree_end(node)])
+
+    def value(self, node: int = 0) -> int:
+        # sub packets have larger indexes, evaluate the subtree backwards
+        values = {}
+        for i in reversed(range(node, self.subtree_end(node))):
+            if self.packet_type[i] == 4:
+                values[i] = self.get_literal(i)
+            else:
+                sub_values = [values.pop(child) for child in self.sub_packets(i)]
+                values[i] = packet_value(self.packet_type[i], 0, sub_values)
+        return values[node]
+
+    @staticmethod
+    def parse(reader: BitReader) -> 'PacketTree':
+        tree = PacketTree()
+        # [node, length_type_id, end bit or number of sub packets, n sub packets, last sub packet]
+        stack = []
+        while True:
+            start_bit = reader.pos
+            node = tree.add(reader.read(3), reader.read(3), start_bit)
+            if stack:
+                parent = stack[-1]
+                if parent[4] == tree.NO_NODE:
+                    tree.first_child[parent[0]] = node
+                else:
+                    tree.next_sibling[parent[4]] = node
+                parent[3] += 1
+                parent[4] = node
+
+            if tree.packet_type[node] == 4:
+                literal_value = 0
+                while True:
+                    group = reader.read(5)
+                    literal_value = (literal_value << 4) | (group & 0b1111)
+                    if not group & 0b10000:
+                        break
+                tree.set_literal(node, literal_value)
+                tree.length[node] = reader.pos - start_bit
+            elif reader.read(1) == 0:  # length reps number of bits
+                sub_pack_length = reader.read(15)
+                stack.append([node, 0, reader.pos + sub_pack_length, 0, tree.NO_NODE])
+            else:  # length reps number of packets
+                stack.append([node, 1, reader.read(11), 0, tree.NO_NODE])
+
+            while stack:
+                parent, length_type_id, limit, n_sub_packets, _ = stack[-1]
+                if length_type_id == 0 and reader.pos < limit:
+                    break
+                if length_type_id == 1 and n_sub_packets < limit:
+                    break
+                tree.length[parent] = reader.pos - tree.start_bit[parent]
+                stack.pop()
+
+            if not stack:
+                return tree
+
+
+def fold_value(packet_type: int, acc: int, value: int) -> int:
+    # combine the value of the operator so far with the next sub packet value
+    if packet_type == 0:
+        return acc + value
+    if packet_type == 1:
+        return acc * value
+    if packet_type == 2:
+        return min(acc, value)
+    if packet_type == 3:
+        return max(acc, value)
+    if packet_type == 5:
+        return 1 if acc > value else 0
+    if packet_type == 6:
+        return 1 if acc < value else 0
+    if packet_type == 7:
+        return 1 if acc == value else 0
+    raise NotImplementedError("Packet type:", packet_type)
+
+
+class DecodedPacket(NamedTuple):
+    version_sum: int
+    value: int
+    length: int
+
+
+class StreamDecoder:
+    """
+    Push parser for hex transmissions, one per line. Chunks of text are given
+    to feed, which returns the top level packets completed so far. Operator
+    values are folded as their sub packets complete, so memory only depends
+    on the current nesting depth.
+    """
+    HEADER, LITERAL, LENGTH_TYPE, LENGTH_BITS, LENGTH_COUNT, PADDING = range(6)
+    FIELD_WIDTH = [6, 5, 1, 15, 11, 0]
+    # hex digits added to the bit buffer at once
+    PIECE_SIZE = 16
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.buffer = 0
+        self.nbits = 0
+        self.pos = 0
+        self.state = self.HEADER
+        self.version = 0
+        self.packet_type = 0
+        self.literal_value = 0
+        # [packet_type, version_sum, value, n_sub_packets, length_type_id, limit]
+        self.stack = []
+
+    def feed(self, chunk: str) -> List[DecodedPacket]:
+        completed = []
+        *lines, last = chunk.split('\n')
+        for line in lines:
+            self.push_hex(line.strip(), completed)
+            self.end_transmission()
+        self.push_hex(last.strip(), completed)
+        return completed
+
+    def close(self) -> None:
+        self.end_transmission()
+
+    def end_transmission(self) -> None:
+        started = self.pos > 0 or self.nbits > 0
+        if started and (self.state != self.PADDING):
+            raise ValueError(f'incomplete packet after {self.pos} bits')
+        self.reset()
+
+    def push_hex(self, hex_seq: str, completed: List[DecodedPacket]) -> None:
+        for k in range(0, len(hex_seq), self.PIECE_SIZE):
+            piece = hex_seq[k:k + self.PIECE_SIZE]
+            self.buffer = (self.buffer << (4 * len(piece))) | int(piece, 16)
+            self.nbits += 4 * len(piece)
+            self.run(completed)
+
+    def read(self, width: int) -> int:
+        self.nbits -= width
+        field = self.buffer >> self.nbits
+        self.buffer &= (1 << self.nbits) - 1
+        self.pos += width
+        return field
+
+    def run(self, completed: List[DecodedPacket]) -> None:
+        while True:
+            if self.state == self.PADDING:
+                # bits after the top level packet are ignored
+                self.pos += self.nbits
+                self.buffer, self.nbits = 0, 0
+                return
+            width = self.FIELD_WIDTH[self.state]
+            if self.nbits < width:
+                return
+            field = self.read(width)
+
+            if self.state == self.HEADER:
+                self.version, self.packet_type = field >> 3, field & 0b111
+                if self.packet_type == 4:
+                    self.literal_value = 0
+                    self.state = self.LITERAL
+                else:
+                    self.state = self.LENGTH_TYPE
+            elif self.state == self.LITERAL:
+                self.literal_value = (self.literal_value << 4) | (field & 0b1111)
+                if not field & 0b10000:
+                    self.complete(self.version, self.literal_value, completed)
+            elif self.state == self.LENGTH_TYPE:
+                self.state = self.LENGTH_BITS if field == 0 else self.LENGTH_COUNT
+            else:
+                length_type_id = 0 if self.state == self.LENGTH_BITS else 1
+                limit = self.pos + field if length_type_id == 0 else field
+                frame = [self.packet_type, self.version, None, 0, length_type_id, limit]
+                self.stack.append(frame)
+                self.state = self.HEADER
+                if self.is_complete(frame):
+                    # operator without sub packets
+                    self.stack.pop()
+                    self.complete(frame[1], packet_value(frame[0], 0, []), completed)
+
+    def is_complete(self, frame: list) -> bool:
+        if frame[4] == 0:
+            return self.pos >= frame[5]
+        return frame[3] >= frame[5]
+
+    def complete(self, version_sum: int, value: int, completed: List[DecodedPacket]) -> None:
+        while self.stack:
+            frame = self.stack[-1]
+            frame[1] += version_sum
+            frame[2] = value if frame[3] == 0 else fold_value(frame[0], frame[2], value)
+            frame[3] += 1
+            if not self.is_complete(frame):
+                self.state = self.HEADER
+                return
+            self.stack.pop()
+            version_sum, value = frame[1], frame[2]
+
+        completed.append(DecodedPacket(version_sum, value, self.pos))
+        self.state = self.PADDING
+
+
+def decode_stream(chunks: Iterable[str]) -> Iterator[DecodedPacket]:
+    decoder = StreamDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+    decoder.close()
+
+
+def nested_packet_hex(depth: int, literal_value: int = 1) -> str:
+    # sum packets with a single sub packet each, around a literal
+    header = '000' + '000' + '1' + '00000000001'
+    bits = header * depth + '000' + '100' + '0' + bin(literal_value)[2:].rjust(4, '0')
+    bits += '0' * (-len(bits) % 4)
+    return hex(int('1' + bits, 2))[3:].upper()
+
+
 def tests():
 
     # Hex to binary conversion tests
@@ -202,6 +593,7 @@ def tests():
         packet = extract_from_hex(h)
         pv = packet.version_sum
         assert packet.version_sum == r, pv
+        assert extract_from_reader(BitReader.from_hex(h)).version_sum == r
 
     # Value tests
     test_cases = [
@@ -218,15 +610,73 @@ def tests():
         packet = extract_from_hex(i)
         test_result = packet.value
         assert test_result == r, i
+        assert extract_from_reader(BitReader.from_hex(i)).value == r, i
+
+    # Bit reader tests
+    reader = BitReader.from_hex('D2FE28')
+    assert [reader.read(3), reader.read(3), reader.read(5)] == [6, 4, 0b10111]
+    assert reader.read(13) == 0b1111000101000
+    assert reader.pos == len(reader) == 24
+    packet = extract_from_reader(BitReader.from_hex('D2FE28'))
+    assert packet.value == 2021 and len(packet) == 21
+
+    # Iterative parser tests
+    for h, r in version_sum_tests + test_cases:
+        packet = parse_packets(BitReader.from_hex(h))
+        expected = extract_from_hex(h)
+        assert evaluate(packet) == (expected.version_sum, expected.value), h
+        assert len(packet) == len(expected), h
+
+    deep_hex = nested_packet_hex(100_000, literal_value=7)
+    packet = parse_packets(BitReader.from_hex(deep_hex))
+    assert evaluate(packet) == (0, 7)
+    assert len(packet) == 100_000 * 18 + 11
+
+    # Packet tree tests
+    for h, r in version_sum_tests + test_cases:
+        tree = PacketTree.parse(BitReader.from_hex(h))
+        packet = parse_packets(BitReader.from_hex(h))
+        assert (tree.version_sum(), tree.value()) == evaluate(packet), h
+        assert tree.length[0] == len(packet), h
+        assert tree.subtree_end(0) == len(tree)
+        for node, sub_packet in zip(tree.sub_packets(0), packet.sub_packets):
+            assert tree.value(node) == sub_packet.value, h
+            assert tree.version_sum(node) == sub_packet.version_sum, h
+
+    tree = PacketTree.parse(BitReader.from_hex(deep_hex))
+    assert (len(tree), tree.version_sum(), tree.value()) == (100_001, 0, 7)
+    assert tree.value(99_999) == 7 and tree.length[99_999] == 18 + 11
+
+    tree = PacketTree.parse(BitReader.from_hex(nested_packet_hex(0, 15)))
+    tree.set_literal(0, 1 << 70)
+    assert tree.value() == 1 << 70
+
+    # Streaming decoder tests
+    transmissions = [h for h, _ in version_sum_tests + test_cases] + ['D2FE28', nested_packet_hex(10_000)]
+    stream = '\n'.join(transmissions) + '\n'
+    expected = [evaluate(parse_packets(BitReader.from_hex(h))) for h in transmissions]
+    for chunk_size in [1, 3, 64, len(stream)]:
+        chunks = (stream[k:k + chunk_size] for k in range(0, len(stream), chunk_size))
+        decoded = list(decode_stream(chunks))
+        assert [(p.version_sum, p.value) for p in decoded] == expected, chunk_size
+    assert decoded[-2].length == 21
 
 
 def main():
     with open('data/input.txt') as f:
         data = f.read().splitlines()
 
-    packet = extract_from_hex(data[0])
-    print(packet.version_sum)
-    print(packet.value)
+    packet = parse_packets(BitReader.from_hex(data[0]))
+    tree = PacketTree.parse(BitReader.from_hex(data[0]))
+    assert (tree.version_sum(), tree.value()) == evaluate(packet)
+    assert packet.value == extract_from_hex(data[0]).value
+    version_sum, value = evaluate(packet)
+
+    with open('data/input.txt') as f:
+        [decoded] = decode_stream(iter(lambda: f.read(1 << 12), ''))
+    assert (decoded.version_sum, decoded.value) == (version_sum, value)
+    print(version_sum)
+    print(value)
 
 
 if __name__ == '__main__':